@@ -0,0 +1,4 @@
+import sys
+
+sys.dont_write_bytecode = True
+from . import scan
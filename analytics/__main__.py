@@ -0,0 +1,174 @@
+import sys
+import os
+import csv
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any
+
+sys.dont_write_bytecode = True
+from .scan import discover, scan
+from .scan import PASSED, FAILED, UNFINISHED
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# usage: python -m analytics logs/gpt_4o-vm-screenshot logs/gpt_4o-vm-a11y_tree [--out dir]
+# task dirs under each logs_path are read by a process pool, packed or not
+# success_rate = passed / (passed + failed); unfinished tasks are counted aside
+# tables written to --out:
+# - tasks: one row per task
+# - groups: success rates and step counts per (label, dimension, key)
+# - steps: distribution of step counts per (label, dimension, key)
+# - timing: percentiles of per-step seconds of each phase in traj.jsonl
+DIMENSIONS = ("all", "app", "sort", "obs")
+PERCENTILES = (50, 90, 99)
+FORMATS = ("csv", "parquet")
+
+
+# nearest-rank percentile of sorted values
+def percentile(values: List[float], q: float) -> float:
+    index = max(0, min(len(values) - 1, -(-len(values) * q // 100) - 1))
+    return values[int(index)]
+
+
+def labels(paths: List[str]) -> List[Tuple[str, str]]:
+    paths = [os.path.normpath(os.path.expanduser(path)) for path in paths]
+    names = [os.path.basename(path) for path in paths]
+    # fall back to full paths if two logs_path share the same name
+    if len(set(names)) < len(names):
+        names = paths
+    return list(zip(names, paths))
+
+
+def collect(paths: List[str], workers: int) -> List[Dict[str, Any]]:
+    items = [
+        (label, logs_path, ident)
+        for label, logs_path in labels(paths)
+        for ident in discover(logs_path)
+    ]
+    if workers == 1 or len(items) <= 1:
+        return list(map(scan, items))
+
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(scan, items, chunksize=chunksize))
+
+
+def aggregate(rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    buckets: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        for dimension in DIMENSIONS:
+            key = "*" if dimension == "all" else row[dimension]
+            buckets.setdefault((row["label"], dimension, key), []).append(row)
+
+    groups, steps, timing = [], [], []
+    for (label, dimension, key), bucket in sorted(buckets.items()):
+        prefix = {"label": label, "dimension": dimension, "key": key}
+        results = [row["result"] for row in bucket]
+        passed, failed = results.count(PASSED), results.count(FAILED)
+        counts = sorted([row["steps"] for row in bucket])
+        groups.append({
+            **prefix,
+            "tasks": len(bucket),
+            "passed": passed,
+            "failed": failed,
+            "unfinished": results.count(UNFINISHED),
+            "success_rate": round(passed / (passed + failed), 4) \
+                if passed + failed > 0 else None,
+            "steps_mean": round(sum(counts) / len(counts), 2),
+            **{f"steps_p{q}": percentile(counts, q) for q in PERCENTILES},
+            "steps_max": counts[-1]
+        })
+
+        for count in sorted(set(counts)):
+            steps.append({**prefix, "steps": count, "tasks": counts.count(count)})
+
+        phases: Dict[str, List[float]] = {}
+        for row in bucket:
+            for phase, seconds in row["timing"].items():
+                phases.setdefault(phase, []).extend(seconds)
+        for phase, seconds in sorted(phases.items()):
+            seconds.sort()
+            timing.append({
+                **prefix,
+                "phase": phase,
+                "samples": len(seconds),
+                "mean": round(sum(seconds) / len(seconds), 4),
+                **{f"p{q}": round(percentile(seconds, q), 4) for q in PERCENTILES}
+            })
+
+    tasks = [
+        {name: value for name, value in row.items() if name != "timing"}
+        for row in rows
+    ]
+    return {"tasks": tasks, "groups": groups, "steps": steps, "timing": timing}
+
+
+def write(tables: Dict[str, List[Dict[str, Any]]], out_path: str, format: str) -> None:
+    os.makedirs(out_path, exist_ok=True)
+    for name, rows in tables.items():
+        file_path = os.path.join(out_path, f"{name}.{format}")
+        if format == "parquet":
+            pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), file_path)
+            continue
+
+        with open(file_path, mode="w", encoding="utf-8", newline="") as writable:
+            writer = csv.DictWriter(
+                writable,
+                fieldnames=list(rows[0].keys()) if len(rows) > 0 else []
+            )
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def report(groups: List[Dict[str, Any]]) -> None:
+    for group in groups:
+        rate = "-" if group["success_rate"] is None \
+            else f"{group['success_rate'] * 100:.2f}%"
+        print(
+            f"{group['label']:<32} "
+            f"{group['dimension']:<6}"
+            f"{group['key']:<24}"
+            f"{group['passed']:>5}/{group['passed'] + group['failed']:<5}"
+            f"{rate:>9}  "
+            f"steps p50 {group['steps_p50']:<4} p90 {group['steps_p90']:<4} "
+            f"unfinished {group['unfinished']}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m analytics")
+    parser.add_argument("paths", nargs="+", help="logs_path of runs to compare")
+    parser.add_argument("--out", type=str, default=None, help="write tables here")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    assert args.workers > 0
+    assert all([os.path.isdir(os.path.expanduser(path)) for path in args.paths])
+    assert args.format != "parquet" or pyarrow is not None, \
+        "pyarrow is required for parquet output"
+
+    started = time.perf_counter()
+    tables = aggregate(collect(args.paths, args.workers))
+    if not args.quiet:
+        report(tables["groups"])
+    if args.out is not None:
+        write(tables, os.path.expanduser(args.out), args.format)
+
+    print(
+        f"{len(tables['tasks'])} tasks analyzed in "
+        f"{time.perf_counter() - started:.2f} s",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
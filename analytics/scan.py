@@ -0,0 +1,126 @@
+import sys
+import os
+import json
+import mmap
+
+from typing import Optional, List, Tuple, Dict, Iterator, Any
+
+sys.dont_write_bytecode = True
+from sci import Log, Pack, TypeSort, OBS
+
+UNKNOWN = "unknown"
+UNFINISHED = "unfinished"
+PASSED = "passed"
+FAILED = "failed"
+
+SORTS = {sort.lower(): sort for sort in TypeSort.Sort._member_names_}
+OBS_TYPES = {
+    value for key, value in vars(OBS).items()
+    if not key.startswith("_") and isinstance(value, str)
+}
+
+# files any task dir has once it has been started
+MARKERS = {
+    Log.RESULT_FILENAME,
+    Log.SUMMARY_FILENAME,
+    Log.TRAJ_FILENAME,
+    Pack.FILENAME
+}
+
+
+# idents of all task dirs under logs_path; nested dirs are searched as well
+# because the org of tasks dir is never assumed, see Log.__clear()
+def discover(logs_path: str) -> List[str]:
+    idents, stack = [], [""]
+    while len(stack) > 0:
+        infix = stack.pop()
+        filenames, dirnames = set(), []
+        with os.scandir(os.path.join(logs_path, infix)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    filenames.add(entry.name)
+                elif entry.is_dir() \
+                    and not entry.name.startswith(".") \
+                    and entry.name not in Pack.DIRNAMES:
+                    dirnames.append(entry.name)
+
+        if infix != "" and not filenames.isdisjoint(MARKERS):
+            idents.append(infix.replace(os.sep, "/"))
+        stack.extend([os.path.join(infix, dirname) for dirname in dirnames])
+    return sorted(idents)
+
+
+# lines of a JSONL file; large files are mapped instead of read
+def lines(save_path: str, pack: Optional[Pack], filename: str) -> Iterator[bytes]:
+    file_path = os.path.join(save_path, filename)
+    if os.path.exists(file_path):
+        if os.path.getsize(file_path) == 0:
+            return
+        with open(file_path, mode="rb") as readable, \
+            mmap.mmap(readable.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                if len(line.strip()) > 0:
+                    yield line
+    elif pack is not None and filename in pack:
+        for line in pack.read(filename).splitlines():
+            if len(line.strip()) > 0:
+                yield line
+
+
+def read(save_path: str, pack: Optional[Pack], filename: str) -> Optional[bytes]:
+    file_path = os.path.join(save_path, filename)
+    if os.path.exists(file_path):
+        with open(file_path, mode="rb") as readable:
+            return readable.read()
+    elif pack is not None and filename in pack:
+        return pack.read(filename)
+    return None
+
+
+# (sort, obs) from names of logs_path like gpt_4o-vm-a11y_tree
+# for logs written before summary.json records them
+def guess(label: str) -> Tuple[str, str]:
+    parts = label.split("-")
+    sort = next((SORTS[part] for part in parts if part in SORTS), UNKNOWN)
+    obs = "+".join(sorted([part for part in parts if part in OBS_TYPES])) or UNKNOWN
+    return sort, obs
+
+
+# one row per task with per-step timing in seconds
+# runs in worker processes, so only plain data goes in and out
+def scan(item: Tuple[str, str, str]) -> Dict[str, Any]:
+    label, logs_path, ident = item
+    save_path = os.path.join(logs_path, ident)
+    pack = Pack(save_path) if Pack.packed(save_path) else None
+    try:
+        result = read(save_path, pack, Log.RESULT_FILENAME)
+        summary = read(save_path, pack, Log.SUMMARY_FILENAME)
+        summary = {} if summary is None else json.loads(summary)
+
+        timing: Dict[str, List[float]] = {}
+        steps = 0
+        for line in lines(save_path, pack, Log.TRAJ_FILENAME):
+            record = json.loads(line)
+            steps += 1
+            for phase, seconds in record.get("timing", {}).items():
+                timing.setdefault(phase, []).append(sum(seconds))
+    finally:
+        if pack is not None:
+            pack.close()
+
+    sort, obs = guess(label)
+    return {
+        "label": label,
+        "ident": ident,
+        "app": summary.get("type", ident.split("/")[0] if "/" in ident else UNKNOWN),
+        "sort": summary.get("sort", sort),
+        "obs": "+".join(summary["obs"]) if "obs" in summary else obs,
+        "result": UNFINISHED if result is None \
+            else PASSED if result.decode("utf-8").strip() == "1" else FAILED,
+        "stop_type": summary.get("stop_type"),
+        "steps": summary.get("steps", steps),
+        "prompt_tokens": summary.get("prompt_tokens"),
+        "completion_tokens": summary.get("completion_tokens"),
+        "seconds": summary.get("seconds"),
+        "timing": timing
+    }
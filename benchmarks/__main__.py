@@ -0,0 +1,239 @@
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from typing import List, Dict, Any
+
+sys.dont_write_bytecode = True
+from sci import Tester, Manager, Log, ResultStore, Pack
+from sci import AllInOne, AIOAgent, ImagePolicy
+from sci import TypeSort, OBS
+from . import mock
+
+# usage: python -m benchmarks [--scenarios ...] [--json out.json] [--baseline base.json]
+# everything runs through the real Tester -> Task -> Community -> Agent -> CodeLike
+# while Model and Manager are replaced by mocks without network or VM
+# overhead = wall time of Tester.__call__() - waiting injected by mocks
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "raw": {
+        "sort": TypeSort.Sort.Raw,
+        "obs": {OBS.screenshot}
+    },
+    "vm-screenshot": {
+        "sort": TypeSort.Sort.VM,
+        "obs": {OBS.screenshot}
+    },
+    "vm-a11y": {
+        "sort": TypeSort.Sort.VM,
+        "obs": {OBS.screenshot, OBS.a11y_tree}
+    },
+    "vm-som": {
+        "sort": TypeSort.Sort.VM,
+        "obs": {OBS.set_of_marks}
+    }
+}
+
+MOCK_TYPE = "Mock"
+INSTRUCTION = "Click the buttons one by one and tell me when finished."
+
+
+def write_tasks(tasks_path: str, sort: TypeSort.Sort, tasks: int, steps: int) -> None:
+    for index in range(tasks):
+        config_path = os.path.join(tasks_path, f"{MOCK_TYPE}-{index:05d}.json")
+        with open(config_path, mode="w", encoding="utf-8") as writable:
+            json.dump({
+                "type": MOCK_TYPE,
+                "sort": sort.name,
+                "steps": steps,
+                "instruction": INSTRUCTION,
+                "version": "0.1",
+                "initialize": [],
+                "evaluate": [{"type": "stop", "value": "DONE"}]
+            }, writable, indent=2)
+
+
+# phases of summary.json in milliseconds per step
+def collect_phases(logs_path: str) -> Dict[str, float]:
+    total_steps, phases = 0, {}
+    for dir_path, _, filenames in os.walk(logs_path):
+        if Log.SUMMARY_FILENAME not in filenames and Pack.FILENAME not in filenames:
+            continue
+        with Pack.open(dir_path, Log.SUMMARY_FILENAME) as readable:
+            summary = json.load(readable)
+        total_steps += summary["steps"]
+        for phase, seconds in summary["timing"].items():
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    return {
+        phase: round(seconds * 1000 / max(total_steps, 1), 3)
+        for phase, seconds in sorted(phases.items())
+    }
+
+
+def run(name: str, args: argparse.Namespace, base_path: str) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    tasks_path = os.path.join(base_path, name, "tasks")
+    logs_path = os.path.join(base_path, name, "logs")
+    os.makedirs(tasks_path)
+    write_tasks(tasks_path, scenario["sort"], args.tasks, args.steps)
+
+    assets = mock.Assets(tuple(args.size), args.nodes)
+    manager_args = lambda: {
+        "version": "0.1",
+        "assets": assets,
+        "latency": args.env_latency
+    }
+    handle_managers = lambda headless, vm_path: {
+        TypeSort.VM: manager_args,
+        TypeSort.Raw(MOCK_TYPE): manager_args
+    }
+
+    model = mock.MockModel(
+        model_style=args.style,
+        base_url="mock://",
+        model_name="mock",
+        replies=[mock.MockModel.ACTION] * (args.steps - 1) + [mock.MockModel.DONE],
+        latency=args.model_latency
+    )
+
+    started = time.perf_counter()
+    tester = Tester(
+        tasks_path=tasks_path,
+        logs_path=logs_path,
+        community=AllInOne(AIOAgent(model=model, image_policy=ImagePolicy(
+            max_side=args.max_side,
+            format=args.image_format,
+            quality=args.quality
+        ))),
+        obs_types=scenario["obs"],
+        vm_path=base_path,
+        headless=True,
+        handle_managers=handle_managers,
+        handle_modules=lambda: {MOCK_TYPE: mock},
+        pack=args.pack
+    )
+    setup = time.perf_counter() - started
+
+    mock.Clock.reset()
+    started = time.perf_counter()
+    tester()
+    wall = time.perf_counter() - started
+    injected = mock.Clock.slept
+
+    counts = tester.store.summary(logs_path)
+    total_steps = args.tasks * args.steps
+    overhead = wall - injected
+    return {
+        "tasks": args.tasks,
+        "steps": total_steps,
+        "passed": counts[ResultStore.PASSED],
+        "setup_s": round(setup, 3),
+        "wall_s": round(wall, 3),
+        "injected_s": round(injected, 3),
+        "overhead_s": round(overhead, 3),
+        "per_step_ms": round(overhead * 1000 / total_steps, 3),
+        "per_task_ms": round(overhead * 1000 / args.tasks, 3),
+        "per_1000_tasks_s": round(overhead * 1000 / args.tasks, 3),
+        "phases_ms": collect_phases(logs_path)
+    }
+
+
+def report(results: Dict[str, Dict[str, Any]]) -> None:
+    for name, result in results.items():
+        print(
+            f"{name:<16}"
+            f"{result['passed']}/{result['tasks']} passed  "
+            f"overhead {result['per_step_ms']:.2f} ms/step  "
+            f"{result['per_task_ms']:.2f} ms/task  "
+            f"{result['per_1000_tasks_s']:.2f} s/1000 tasks"
+        )
+        for phase, milliseconds in result["phases_ms"].items():
+            print(f"{'':<16}{phase:<24}{milliseconds:>10.3f} ms/step")
+
+
+# scenarios slower than baseline by more than tolerance are regressions
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float
+) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name]["per_step_ms"] * (1 + tolerance)
+        if result["per_step_ms"] > limit:
+            regressions.append(
+                f"{name}: {result['per_step_ms']:.2f} ms/step "
+                f"exceeds {limit:.2f} ms/step of baseline"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--style", choices=["openai", "anthropic"], default="openai")
+    parser.add_argument("--size", type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument("--nodes", type=int, default=100, help="buttons in a11y tree")
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--image-format", choices=["png", "jpeg", "webp"], default="png")
+    parser.add_argument("--quality", type=int, default=None)
+    parser.add_argument("--model-latency", type=float, default=0.0)
+    parser.add_argument("--env-latency", type=float, default=0.0)
+    parser.add_argument("--path", type=str, default=None, help="keep tasks and logs here")
+    parser.add_argument("--pack", action="store_true", help="pack logs of each task")
+    parser.add_argument("--json", type=str, default=None)
+    parser.add_argument("--baseline", type=str, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    assert args.tasks > 0 and args.steps > 0
+
+    # only the harness itself is measured
+    Manager.ACTION_INTERVAL = 0
+    Tester.SHUTDOWN_INTERVAL = 0
+    if mock.Tokenizer.install():
+        print(
+            "Encoding of tiktoken is unavailable; "
+            "a11y trees are trimmed by mock.Tokenizer instead",
+            file=sys.stderr
+        )
+
+    temp_dir = None
+    if args.path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        base_path = temp_dir.name
+    else:
+        base_path = os.path.expanduser(args.path)
+
+    results = {name: run(name, args, base_path) for name in args.scenarios}
+    report(results)
+
+    if args.json is not None:
+        with open(args.json, mode="w", encoding="utf-8") as writable:
+            json.dump(results, writable, indent=2)
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+    failures = [
+        f"{name}: {result['passed']}/{result['tasks']} passed"
+        for name, result in results.items()
+        if result["passed"] != result["tasks"]
+    ]
+    if args.baseline is not None:
+        with open(args.baseline, mode="r", encoding="utf-8") as readable:
+            failures += compare(results, json.load(readable), args.tolerance)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
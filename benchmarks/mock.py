@@ -0,0 +1,289 @@
+import sys
+import json
+import time
+import types
+import threading
+
+from io import BytesIO
+from dataclasses import dataclass, field
+from typing import Optional, List, Tuple, Dict, Any, Self
+
+from requests import Response
+from PIL import Image, ImageDraw
+
+sys.dont_write_bytecode = True
+from sci import Manager, Task, VManager
+from sci.base import Model
+from sci.vm import VTask
+from sci.vm import vmanager
+from sci.vm import utils as vmutils
+from sci.vm.utils import state_ns_ubuntu, component_ns_ubuntu, attributes_ns_ubuntu
+
+# a11y trees are trimmed by tiktoken, which downloads its encoding at the
+# first run; when it cannot be loaded, e.g. offline, this one is installed
+# and bytes are grouped by BYTES_PER_TOKEN to approximate the real cost
+class Tokenizer:
+    BYTES_PER_TOKEN = 4
+
+    def encode(self, text: str) -> List[bytes]:
+        data = text.encode("utf-8")
+        return [
+            data[index:index + Tokenizer.BYTES_PER_TOKEN]
+            for index in range(0, len(data), Tokenizer.BYTES_PER_TOKEN)
+        ]
+
+    def decode(self, tokens: List[bytes]) -> str:
+        return b"".join(tokens).decode("utf-8", errors="ignore")
+
+    # return True if the real tokenizer is replaced
+    @staticmethod
+    def install() -> bool:
+        try:
+            vmutils.tiktoken.encoding_for_model("gpt-4")
+            return False
+        except Exception:
+            vmutils.tiktoken = types.SimpleNamespace(
+                encoding_for_model=lambda model: Tokenizer()
+            )
+            return True
+
+
+# injected waiting of mocks, which is excluded from harness overhead
+class Clock:
+    lock = threading.Lock()
+    slept = 0.0
+
+    @staticmethod
+    def sleep(span: float) -> None:
+        if span <= 0:
+            return
+        time.sleep(span)
+        with Clock.lock:
+            Clock.slept += span
+
+    @staticmethod
+    def reset() -> None:
+        with Clock.lock:
+            Clock.slept = 0.0
+
+
+# canned observations shared by RawManager and VMManager
+# buttons of the a11y tree are drawn on the screenshot
+# so that set_of_marks() has the same amount of work as usual
+class Assets:
+    def __init__(self, size: Tuple[int, int] = (1920, 1080), nodes: int = 100) -> None:
+        width, height = size
+        self.buttons = [(
+            (index * 97) % (width - 120),
+            (index * 53) % (height - 40),
+            100,
+            24
+        ) for index in range(nodes)]
+
+        image = Image.new("RGB", size, color=(238, 238, 238))
+        draw = ImageDraw.Draw(image)
+        for index, (x, y, w, h) in enumerate(self.buttons):
+            draw.rectangle([x, y, x + w, y + h], fill=(250, 250, 250), outline=(96, 96, 96))
+            draw.text((x + 6, y + 6), f"Button {index}", fill=(0, 0, 0))
+
+        png = BytesIO()
+        image.save(png, format="PNG")
+        self.screenshot = png.getvalue()
+
+        self.a11y_tree = "".join([
+            f'<desktop-frame xmlns:st="{state_ns_ubuntu}" '
+            f'xmlns:cp="{component_ns_ubuntu}" '
+            f'xmlns:attr="{attributes_ns_ubuntu}" name="Desktop">',
+            *[(
+                f'<push-button name="Button {index}" attr:class="GtkButton" '
+                f'st:showing="true" st:visible="true" st:enabled="true" '
+                f'cp:screencoord="({x}, {y})" cp:size="({w}, {h})"></push-button>'
+            ) for index, (x, y, w, h) in enumerate(self.buttons)],
+            "</desktop-frame>"
+        ])
+
+
+@dataclass
+class MockModel(Model):
+    ACTION = "I will click the button.\n```python\npyautogui.click(100, 200)\n```"
+    DONE = "The task is finished.\n```\nDONE\n```"
+
+    # replies are returned in turn, one for each request
+    replies: List[str] = field(default_factory=lambda: [MockModel.DONE])
+    latency: float = 0.0
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self.lock = threading.Lock()
+        self.index = 0
+
+    def __reply(self, messages: Dict) -> Tuple[str, int]:
+        # requests encodes the payload in the same way
+        payload = json.dumps({
+            "model": self.model_name,
+            "messages": messages
+        }, allow_nan=False).encode("utf-8")
+
+        with self.lock:
+            reply = self.replies[self.index % len(self.replies)]
+            self.index += 1
+
+        Clock.sleep(self.latency)
+        return reply, len(payload) // 4
+
+    @staticmethod
+    def __response(content: Dict[str, Any]) -> Response:
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps(content).encode("utf-8")
+        return response
+
+    def _request_openai(self, messages: Dict, timeout: int) -> Response:
+        reply, prompt_tokens = self.__reply(messages)
+        return MockModel.__response({
+            "choices": [{"message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply) // 4}
+        })
+
+    def _request_anthropic(self, messages: Dict, timeout: int) -> Response:
+        reply, prompt_tokens = self.__reply(messages)
+        return MockModel.__response({
+            "role": "assistant",
+            "content": [{"type": "text", "text": reply}],
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": len(reply) // 4}
+        })
+
+
+# stands for controller of DesktopEnv
+class MockController:
+    vm_ip = "127.0.0.1"
+
+    def __init__(self, assets: Assets, latency: float) -> None:
+        self.assets = assets
+        self.latency = latency
+
+    def get_screenshot(self) -> bytes:
+        Clock.sleep(self.latency)
+        return self.assets.screenshot
+
+    def get_accessibility_tree(self) -> str:
+        Clock.sleep(self.latency)
+        return self.assets.a11y_tree
+
+    def get_terminal_output(self) -> str:
+        return ""
+
+    def execute_python_command(self, command: str) -> Dict:
+        Clock.sleep(self.latency)
+        return {"status": "success"}
+
+    def start_recording(self) -> None:
+        ...
+
+    def end_recording(self, dest_path: str) -> None:
+        ...
+
+
+# stands for DesktopEnv
+class MockEnv:
+    def __init__(self, assets: Assets, latency: float) -> None:
+        self.controller = MockController(assets, latency)
+        self.snapshot_name = VManager.INIT_NAME
+
+    def _revert_to_snapshot(self) -> None:
+        ...
+
+    def _start_emulator(self) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class RawManager(Manager):
+    def __init__(
+        self,
+        version: str = "0.1",
+        assets: Optional[Assets] = None,
+        latency: float = 0.0
+    ) -> None:
+        super().__init__(version)
+        self.assets = Assets() if assets is None else assets
+        self.latency = latency
+
+    def __call__(self, code: str) -> bool:
+        Clock.sleep(self.latency)
+        return True
+
+    def __enter__(self) -> Self:
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        super().__exit__(exc_type, exc_value, traceback)
+
+    def screenshot(self) -> Image.Image:
+        Clock.sleep(self.latency)
+        return Image.open(BytesIO(self.assets.screenshot))
+
+
+# everything of VManager is kept except for vmrun and DesktopEnv
+class VMManager(VManager):
+    def __init__(
+        self,
+        version: str = "0.1",
+        assets: Optional[Assets] = None,
+        latency: float = 0.0,
+        a11y_tree_limit: int = 10240,
+        **kwargs
+    ) -> None:
+        Manager.__init__(self, version)
+        self.path = None
+        self.headless = True
+        self.a11y_tree_limit = a11y_tree_limit
+
+        assets = Assets() if assets is None else assets
+        self.key = f"{self.__class__.__name__}@{id(self)}"
+        vmanager.ENVS[self.key] = lambda: MockEnv(assets, latency)
+
+    def _request(self, query: str, param: Dict[str, Any]) -> Response:
+        response = Response()
+        response.status_code = 200
+        response._content = b"OK"
+        return response
+
+
+class RawTask(Task):
+    def __init__(
+        self,
+        config_path: str,
+        manager: RawManager,
+        *args,
+        **kwargs
+    ) -> None:
+        assert isinstance(manager, RawManager)
+        self.manager = manager
+        super().__init__(config_path, manager, *args, **kwargs)
+
+    def _init(self) -> bool:
+        return True
+
+    @Task._stop_handler
+    def eval(self) -> bool:
+        return True
+
+
+class VMTask(VTask):
+    def __init__(
+        self,
+        config_path: str,
+        manager: VMManager,
+        *args,
+        **kwargs
+    ) -> None:
+        assert isinstance(manager, VMManager)
+        self.manager = manager
+        super().__init__(config_path, manager, *args, **kwargs)
+
+    @Task._stop_handler
+    def eval(self) -> bool:
+        return True
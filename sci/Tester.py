@@ -1,24 +1,36 @@
 import sys
 import os
 import re
+import glob
+import time
 import copy
+import hashlib
+import statistics
+import uuid
+import queue
+import socket
 import shutil
 import inspect
+import asyncio
 import tempfile
+import threading
 import traceback
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 
-from typing import Union, Optional, List, Set, Dict, Any
+from typing import Union, Optional, List, Tuple, Set, Dict, Any
 from typing import Iterable, Callable, Generator, FrozenSet
 from typing import TypeVar, TypedDict, Unpack, NotRequired
 
 sys.dont_write_bytecode = True
 from . import TypeSort
-from . import Model, ModelType
+from . import Model, ModelType, ImagePolicy, ResponseCache
 from . import Agent, AIOAgent, Community
-from . import Manager, VManager, Task
-from . import Log, VirtualLog
+from . import Manager, VManager, Task, TaskHeader
+from . import Manifest, ResultStore, Pack
+from . import Log, VirtualLog, GLOBAL_VLOG
 from . import OBS, Presets
 from . import Primitive
 
@@ -31,23 +43,30 @@ class Counter:
     skipped: int = 0
     ignored: int = 0
     vlog: VirtualLog = VirtualLog()
-
-    def _pass(self) -> None:
-        self.passed += 1
-        self.vlog.info("\033[1mTask finished with passed=TRUE.\033[0m")
-
-    def _fail(self) -> None:
-        self.failed += 1
-        self.vlog.info("\033[1mTask finished with passed=FALSE.\033[0m")
-
-    def _skip(self) -> None:
-        self.skipped += 1
-        self.vlog.error("Task testing failed; skipped.\n" + traceback.format_exc())
-
-    def _ignore(self) -> None:
-        self.ignored += 1
-        self.vlog.info("Task already finished; ignored.")
-        self.vlog.register(Log.delete)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    # parallel workers share one counter but log to their own files
+    # so vlog can be specified to override the default one
+    def _pass(self, vlog: Optional[VirtualLog] = None) -> None:
+        with self.lock:
+            self.passed += 1
+        (vlog or self.vlog).info("\033[1mTask finished with passed=TRUE.\033[0m")
+
+    def _fail(self, vlog: Optional[VirtualLog] = None) -> None:
+        with self.lock:
+            self.failed += 1
+        (vlog or self.vlog).info("\033[1mTask finished with passed=FALSE.\033[0m")
+
+    def _skip(self, vlog: Optional[VirtualLog] = None) -> None:
+        with self.lock:
+            self.skipped += 1
+        (vlog or self.vlog).error("Task testing failed; skipped.\n" + traceback.format_exc())
+
+    def _ignore(self, vlog: Optional[VirtualLog] = None) -> None:
+        with self.lock:
+            self.ignored += 1
+        (vlog or self.vlog).info("Task already finished; ignored.")
+        (vlog or self.vlog).register(Log.delete)
 
     def __str__(self) -> str:
         total = self.passed + self.failed + self.skipped + self.ignored
@@ -78,10 +97,21 @@ class AutomataType(TypedDict):
     top_p: NotRequired[Optional[float]]
     temperature: NotRequired[Optional[float]]
     reason_effort: NotRequired[Optional[str]]
+    pool_size: NotRequired[int]
+    cache: NotRequired[Optional[ResponseCache]]
+    stream: NotRequired[bool]
+    rpm: NotRequired[Optional[float]]
+    burst: NotRequired[Optional[int]]
+    max_throttles: NotRequired[int]
+    max_context: NotRequired[Optional[int]]
+    prompt_cache: NotRequired[bool]
     overflow_style: NotRequired[Optional[str]]
     context_window: NotRequired[int]
     hide_text: NotRequired[bool]
     code_style: NotRequired[str]
+    image_policy: NotRequired[Optional[ImagePolicy]]
+    stop_at_code: NotRequired[bool]
+    probe: NotRequired[Optional[int]]
 
 
 # Automata receive keyword args from Model and Agent
@@ -157,39 +187,69 @@ class Automata:
         return self().prompt_factory(obs, type_sort, primitives, manager)("...")
 
 
+# task is built by load() only when it is about to run
+# so that memory does not grow with the number of configs
 class TaskInfo:
-    def __init__(self, task: Task, infix: str = "") -> None:
-        assert isinstance(task, Task)
-        self.task = task
+    def __init__(
+        self,
+        header: TaskHeader,
+        load: Callable[[TaskHeader], Task],
+        manager: Callable[[TypeSort], Manager],
+        infix: str = ""
+    ) -> None:
+        assert isinstance(header, TaskHeader)
+        self.header = header
+
+        assert hasattr(load, "__call__")
+        self.load = load
+
+        assert hasattr(manager, "__call__")
+        self.__manager = manager
 
         assert isinstance(infix, str)
         self.infix = infix
 
+    @property
+    def manager(self) -> Manager:
+        return self.__manager(self.header.type_sort)
+
     @property
     def ident(self):
-        identifier = os.path.join(self.infix, self.task.name)
+        identifier = os.path.join(self.infix, self.header.name)
         if sys.platform == "win32":
-            identifier.replace("\\", "/")
+            identifier = identifier.replace("\\", "/")
         return identifier
 
+    # stable across processes and platforms, unlike hash()
+    # raw tasks are sharded by type so that each group stays on one node,
+    # while tasks sharing the VM manager are spread one by one
+    def shard(self, total: int) -> int:
+        type_sort = self.header.type_sort
+        key = self.ident if type_sort.sort == TypeSort.Sort.VM else repr(type_sort)
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return int(digest, 16) % total
+
     def __lt__(self, __value: "TaskInfo") -> bool:
-        left, right = self.task, __value.task
+        left, right = self.header, __value.header
         return left.sort < right.sort or \
             (left.sort == right.sort and left.type < right.type)
 
     def __repr__(self) -> str:
-        return f"{self.ident}: {self.task.sort}.{self.task.type}"
+        return f"{self.ident}: {self.header.sort}.{self.header.type}"
 
     def __call__(self) -> bool:
-        return self.task()
+        return self.load(self.header)()
 
     # return True if the task has not been finished
-    def snoop(self, base_path: str) -> bool:
-        return not os.path.exists(os.path.join(
-            base_path,
-            self.ident,
+    # finished idents from ResultStore avoid probing result.out
+    def snoop(self, base_path: str, finished: Optional[Set[str]] = None) -> bool:
+        if finished is not None:
+            return self.ident not in finished
+
+        return not Pack.exists(
+            os.path.join(base_path, self.ident),
             Log.RESULT_FILENAME
-        ))
+        )
 
 
 class TaskGroup:
@@ -201,31 +261,37 @@ class TaskGroup:
         for task_info in raw:
             assert isinstance(task_info, TaskInfo)
             if last_info is not None \
-                and task_info.task.type_sort == last_info.task.type_sort:
+                and task_info.header.type_sort == last_info.header.type_sort:
                 self.groups[-1].append(task_info)
             else:
                 self.groups.append([task_info])
             last_info = task_info
 
+    # tasks of different types can be grouped only if they share a VM
     def __check(self) -> None:
         for group in self.groups:
             assert len(group) > 0
             for task_info in group:
-                first = group[0].task.manager
-                current = task_info.task.manager
-                if first != current:
-                    assert VManager in first.__class__.mro() \
-                        and VManager in current.__class__.mro()
+                first = group[0].header
+                current = task_info.header
+                if first.type != current.type:
+                    assert first.type_sort.sort == TypeSort.Sort.VM \
+                        and current.type_sort.sort == TypeSort.Sort.VM
 
-    def __call__(self, base_path: str, ignore: bool) -> Generator:
+    def __call__(
+        self,
+        base_path: str,
+        ignore: bool,
+        finished: Optional[Set[str]] = None
+    ) -> Generator:
         assert isinstance(base_path, str)
         assert isinstance(ignore, bool)
         self.__check()
 
         for group in self.groups:
-            has_unfinished = any([item.snoop(base_path) for item in group])
+            has_unfinished = any([item.snoop(base_path, finished) for item in group])
             if has_unfinished or not ignore:
-                with group[0].task.manager:
+                with group[0].manager:
                     for task_info in group:
                         yield task_info
             else:
@@ -233,6 +299,280 @@ class TaskGroup:
                     yield task_info
 
 
+# longest-processing-time-first order for parallel workers and nodes
+# cost of a task is estimated in turn from
+# - mean duration of its own past runs in ResultStore
+# - its steps times mean seconds per step of past runs of the same type
+# - its steps times STEP_COST of its sort
+# raw managers are exited on switching, so their tasks are kept in blocks
+# while VM tasks of all types share one VM and are ordered freely
+class Scheduler:
+    STEP_COST = {
+        TypeSort.Sort.Raw: 15.0,
+        TypeSort.Sort.VM: 30.0
+    }
+
+    def __init__(self, raw: List[TaskInfo], store: ResultStore) -> None:
+        assert isinstance(raw, list)
+        self.raw = raw
+
+        types = {task_info.ident: task_info.header.type for task_info in raw}
+        history: Dict[str, List[float]] = {}
+        rates: Dict[str, List[float]] = {}
+        for ident, steps, seconds in store.durations():
+            history.setdefault(ident, []).append(seconds)
+            if ident in types:
+                rates.setdefault(types[ident], []).append(seconds / steps)
+
+        self.history = {key: statistics.mean(value) for key, value in history.items()}
+        self.rates = {key: statistics.mean(value) for key, value in rates.items()}
+        self.costs = {task_info.ident: self.cost(task_info) for task_info in raw}
+
+    def cost(self, task_info: TaskInfo) -> float:
+        if task_info.ident in self.history:
+            return self.history[task_info.ident]
+
+        header = task_info.header
+        rate = self.rates.get(header.type, Scheduler.STEP_COST[header.type_sort.sort])
+        return header.steps * rate
+
+    def __call__(self) -> List[TaskInfo]:
+        blocks: Dict[str, List[TaskInfo]] = {}
+        for task_info in self.raw:
+            type_sort = task_info.header.type_sort
+            key = task_info.ident if type_sort.sort == TypeSort.Sort.VM \
+                else str(type_sort)
+            blocks.setdefault(key, []).append(task_info)
+
+        cost = lambda task_info: self.costs[task_info.ident]
+        ordered = sorted(
+            blocks.values(),
+            key=lambda block: sum(map(cost, block)),
+            reverse=True
+        )
+        return [
+            task_info
+            for block in ordered
+            for task_info in sorted(block, key=cost, reverse=True)
+        ]
+
+
+# coordinator-free queue for nodes sharing one logs_path
+# - a task is claimed by creating its lease file exclusively
+# - leases are kept alive by heartbeats and reclaimed once expired
+# - result.out still marks the task as finished
+# interface follows queue.Queue so that Worker can consume it directly
+class LeaseQueue:
+    DIRNAME = ".leases"
+    SUFFIX = ".lease"
+    TTL = 300
+    POLL = 30
+
+    def __init__(self, base_path: str, raw: List[TaskInfo]) -> None:
+        assert isinstance(base_path, str)
+        self.base_path = base_path
+        self.lease_path = os.path.join(base_path, LeaseQueue.DIRNAME)
+
+        assert isinstance(raw, list)
+        self.pending = raw[:]
+
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.held: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+        self.stopped = threading.Event()
+        self.heart = threading.Thread(target=self.__heartbeat, daemon=True)
+        self.heart.start()
+
+    def __path(self, ident: str) -> str:
+        return os.path.join(self.lease_path, ident + LeaseQueue.SUFFIX)
+
+    @staticmethod
+    def __expired(path: str) -> bool:
+        return time.time() - os.stat(path).st_mtime > LeaseQueue.TTL
+
+    # only one node can rename the expired lease away
+    # a fresh lease renamed by mistake in between is put back
+    def __reclaim(self, path: str) -> None:
+        tomb_path = f"{path}.{uuid.uuid4().hex}"
+        try:
+            if not self.__expired(path):
+                return
+            os.rename(path, tomb_path)
+            if not self.__expired(tomb_path) and not os.path.exists(path):
+                os.rename(tomb_path, path)
+            else:
+                os.remove(tomb_path)
+        except FileNotFoundError:
+            pass
+
+    def __acquire(self, ident: str) -> bool:
+        path = self.__path(ident)
+        os.makedirs(os.path.split(path)[0], exist_ok=True)
+        self.__reclaim(path)
+
+        try:
+            lease = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(lease, mode="w", encoding="utf-8") as writable:
+            writable.write(self.owner)
+        self.held[ident] = path
+        return True
+
+    def __release(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __heartbeat(self) -> None:
+        while not self.stopped.wait(LeaseQueue.TTL / 3):
+            with self.lock:
+                paths = list(self.held.values())
+            for path in paths:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    GLOBAL_VLOG.warning(f"Lease lost before heartbeat: {path}")
+
+    # tasks held by other nodes are polled until finished or reclaimed
+    # each task is attempted at most once by a single queue
+    def get_nowait(self) -> TaskInfo:
+        while True:
+            with self.lock:
+                for task_info in self.pending[:]:
+                    if not task_info.snoop(self.base_path):
+                        self.pending.remove(task_info)
+                    elif self.__acquire(task_info.ident):
+                        self.pending.remove(task_info)
+                        # finished by another node right before acquired
+                        if task_info.snoop(self.base_path):
+                            return task_info
+                        self.__release(self.held.pop(task_info.ident))
+
+                if len(self.pending) == 0:
+                    raise queue.Empty
+            time.sleep(LeaseQueue.POLL)
+
+    # leases are looked up by ident rather than by thread
+    # as get_nowait() and task_done() may run on different threads
+    def task_done(self, task_info: TaskInfo) -> None:
+        with self.lock:
+            path = self.held.pop(task_info.ident, None)
+        if path is not None:
+            self.__release(path)
+
+    def close(self) -> None:
+        self.stopped.set()
+        with self.lock:
+            paths = list(self.held.values())
+            self.held.clear()
+        for path in paths:
+            self.__release(path)
+
+
+# a worker owns a VM clone, a forked community and a log of its own
+# so that tasks can be evaluated in parallel with no change to Task
+class Worker:
+    def __init__(self, tester: "Tester", index: int, vm_path: str) -> None:
+        assert isinstance(index, int)
+        self.index = index
+
+        assert isinstance(vm_path, str)
+        self.vm_path = vm_path
+
+        self.tester = tester
+        self.log = Log(global_vlog=False)
+        self.vlog = VirtualLog()
+        self.vlog.set(self.log)
+
+        self.community = tester.community.fork()
+        self.community.vlog.set(self.log)
+        for _, agent in self.community:
+            agent.vlog.set(self.log)
+
+        self.manager_args = tester.handle_managers(tester.headless, vm_path)
+        self.managers = {}
+
+    def __manager(self, type_sort: TypeSort) -> Manager:
+        return self.tester._manager(
+            type_sort,
+            self.managers,
+            self.manager_args,
+            self.log
+        )
+
+    def __load(self, header: TaskHeader) -> Task:
+        new_task = self.tester._spawn(
+            header,
+            self.__manager(header.type_sort),
+            self.community
+        )
+        new_task.vlog.set(self.log)
+        return new_task
+
+    # LeaseQueue releases the lease of the task given
+    @staticmethod
+    def __done(tasks: Union[queue.Queue, LeaseQueue], task_info: TaskInfo) -> None:
+        if isinstance(tasks, LeaseQueue):
+            tasks.task_done(task_info)
+        else:
+            tasks.task_done()
+
+    def __call__(
+        self,
+        tasks: Union[queue.Queue, LeaseQueue],
+        counter: Counter
+    ) -> None:
+        # VM is entered only once and reverted to snapshot by each task
+        with ExitStack() as stack:
+            while True:
+                try:
+                    task_info: TaskInfo = tasks.get_nowait()
+                except queue.Empty:
+                    break
+
+                self.tester._evaluate(
+                    task_info,
+                    self.__load,
+                    self.log,
+                    counter,
+                    vlog=self.vlog,
+                    enter=lambda manager: manager.entered \
+                        or stack.enter_context(manager)
+                )
+                Worker.__done(tasks, task_info)
+        self.log.callback()
+
+    # coroutine of Tester(asynchronous=True); see Tester._aevaluate()
+    # LeaseQueue.get_nowait() may poll with sleep, so it goes to a thread
+    async def acall(
+        self,
+        tasks: Union[queue.Queue, LeaseQueue],
+        counter: Counter
+    ) -> None:
+        with ExitStack() as stack:
+            while True:
+                try:
+                    task_info: TaskInfo = await asyncio.to_thread(tasks.get_nowait)
+                except queue.Empty:
+                    break
+
+                await self.tester._aevaluate(
+                    task_info,
+                    self.__load,
+                    self.log,
+                    counter,
+                    vlog=self.vlog,
+                    enter=lambda manager: manager.entered \
+                        or stack.enter_context(manager)
+                )
+                Worker.__done(tasks, task_info)
+        self.log.callback()
+
+
 class Tester:
     SHUTDOWN_INTERVAL = 10
 
@@ -249,7 +589,14 @@ class Tester:
         optimize: bool = True,
         relative: bool = False,
         primitives: Set[str] = set(),
-        handle_managers: Callable = Presets.spawn_managers
+        handle_managers: Callable = Presets.spawn_managers,
+        handle_modules: Callable = Presets.spawn_modules,
+        workers: int = 1,
+        store_path: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        steal: bool = False,
+        pack: bool = False,
+        asynchronous: bool = False
     ) -> None:
         assert isinstance(tasks_path, str)
         tasks_path = os.path.expanduser(tasks_path)
@@ -272,6 +619,29 @@ class Tester:
         os.makedirs(logs_path, exist_ok=True)
         self.logs_path = logs_path
 
+        # shard=(index, total): evaluate only tasks hashed to index
+        # which makes several nodes share one logs_path without conflicts
+        if shard is not None:
+            index, total = shard
+            assert isinstance(total, int) and total > 0
+            assert isinstance(index, int) and index in range(total)
+        self.shard = shard
+
+        # results of all runs can share one store through store_path
+        # but nodes of shards write to their own file by default,
+        # and so do hosts of steal, whose files are merged at each run
+        self.peers: Optional[str] = None
+        if store_path is None:
+            store_path = os.path.join(logs_path, ResultStore.FILENAME)
+            root, ext = os.path.splitext(store_path)
+            if shard is not None:
+                store_path = root + ".{}-{}".format(*shard) + ext
+            elif steal:
+                store_path = root + f".{socket.gethostname()}" + ext
+                self.peers = root + ".*" + ext
+        self.store = ResultStore(store_path)
+        self.finished: Set[str] = set()
+
         # all run-time error / assertion error
         # should be caught in __traverse() & __call()
         # in fact, self.log call inside of tester.__call()
@@ -293,6 +663,9 @@ class Tester:
             assert vm_path is None
         self.vm_path = vm_path
 
+        assert isinstance(headless, bool)
+        self.headless = headless
+
         assert isinstance(primitives, Set)
         self.primitives = set()
 
@@ -304,9 +677,13 @@ class Tester:
 
         # manager in managers should not be Manager itself
         assert hasattr(handle_managers, "__call__")
+        self.handle_managers = handle_managers
         self.manager_args = handle_managers(headless, vm_path)
         self.managers = {}
-        self.modules = Presets.spawn_modules()
+
+        # modules provide {type}.RawManager / VMManager / RawTask / VMTask
+        assert hasattr(handle_modules, "__call__")
+        self.modules = handle_modules()
 
         assert isinstance(ignore, bool)
         self.ignore = ignore
@@ -320,60 +697,126 @@ class Tester:
         assert isinstance(relative, bool)
         self.relative = relative
 
+        # each worker requires a VM clone of its own
+        assert isinstance(workers, int) and workers > 0
+        assert workers == 1 or vm_path is not None
+        self.workers = workers
+
+        # nodes claim tasks through leases instead of static shards
+        # finished tasks cannot be rerun then, as result.out is the marker
+        assert isinstance(steal, bool)
+        assert not steal or (ignore and shard is None)
+        self.steal = steal
+
+        # workers are run as coroutines on one event loop instead of threads
+        # each of them still owns a VM, a forked community and a log
+        assert isinstance(asynchronous, bool)
+        assert not asynchronous or workers > 1
+        self.asynchronous = asynchronous
+
+        # roll artefacts of each task into one archive once it ends
+        assert isinstance(pack, bool)
+        self.pack = pack
+
         self.task_info: List[TaskInfo] = []
+        self.manifest = Manifest(self.tasks_path)
         self.__traverse()
+        self.manifest.save()
+
+        # partition tasks before grouping so that each node enters
+        # each manager at most once, and raw managers on only one node
+        if self.shard is not None:
+            index, total = self.shard
+            self.task_info = [
+                task_info for task_info in self.task_info
+                if task_info.shard(total) == index
+            ]
         self.task_group = TaskGroup(sorted(self.task_info))
 
     def __del__(self) -> None:
         if self.__temp_dir is not None:
             self.__temp_dir.cleanup()
 
-    def __manager(self, type_sort: TypeSort):
+    # managers, args and log are passed in to be shared with workers
+    def _manager(
+        self,
+        type_sort: TypeSort,
+        managers: Dict[str, Manager],
+        manager_args: Presets.Config,
+        log: Log
+    ) -> Manager:
         # add __str__() to differentiate all managers
-        if str(type_sort) in self.managers:
-            return self.managers[str(type_sort)]
+        if str(type_sort) in managers:
+            return managers[str(type_sort)]
 
         manager_class = getattr(
             self.modules[type_sort.type],
             type_sort(Manager.__name__)
         )
 
-        manager_args = self.manager_args[type_sort]()
-        manager = manager_class(**manager_args)
-        self.managers[str(type_sort)] = manager
-        manager.vlog.set(self.log)
+        manager = manager_class(**manager_args[type_sort]())
+        managers[str(type_sort)] = manager
+        manager.vlog.set(log)
         return manager
 
-    def __load(self, config_path: str) -> Task:
-        # using nil agent & manager only to load type field
-        type_sort = Task(config_path=config_path).type_sort
-        if type_sort.sort == TypeSort.Sort.VM:
-            assert self.vm_path is not None
-
+    def _spawn(
+        self,
+        header: TaskHeader,
+        manager: Manager,
+        community: Community
+    ) -> Task:
+        type_sort = header.type_sort
         task_class = getattr(
             self.modules[type_sort.type],
             type_sort(Task.__name__)
         )
 
         return task_class(
-            config_path=config_path,
-            manager=self.__manager(type_sort),
-            community=self.community,
+            config_path=header.path,
+            manager=manager,
+            community=community,
             obs_types=self.obs_types,
             primitives=self.primitives,
             debug=self.debug,
             relative=self.relative
         )
 
+    def __manager(self, type_sort: TypeSort) -> Manager:
+        return self._manager(
+            type_sort,
+            self.managers,
+            self.manager_args,
+            self.log
+        )
+
+    def __load(self, header: TaskHeader) -> Task:
+        new_task = self._spawn(
+            header,
+            self.__manager(header.type_sort),
+            self.community
+        )
+        new_task.vlog.set(self.log)
+        return new_task
+
+    # only the header is read here (from manifest if cached); see TaskInfo
     def __traverse(self, current_infix: str = "") -> None:
         current_dir_path = os.path.join(self.tasks_path, current_infix)
         for unknown_name in sorted(os.listdir(current_dir_path)):
             unknown_path = os.path.join(current_dir_path, unknown_name)
-            if os.path.isfile(unknown_path):
+            if unknown_name == Manifest.FILENAME:
+                continue
+            elif os.path.isfile(unknown_path):
                 try:
-                    new_task = self.__load(unknown_path)
-                    new_task.vlog.set(self.log)
-                    self.task_info.append(TaskInfo(new_task, infix=current_infix))
+                    header = self.manifest[unknown_path]
+                    assert header.type_sort.type in self.modules
+                    if header.type_sort.sort == TypeSort.Sort.VM:
+                        assert self.vm_path is not None
+                    self.task_info.append(TaskInfo(
+                        header,
+                        load=self.__load,
+                        manager=self.__manager,
+                        infix=current_infix
+                    ))
                 except Exception:
                     error_info = "Config loading failed; skipped: " \
                         + unknown_path \
@@ -383,6 +826,18 @@ class Tester:
             else:
                 self.__traverse(os.path.join(current_infix, unknown_name))
 
+    # build and drop every task to check configs thoroughly
+    def check(self) -> None:
+        for task_info in self.task_info:
+            try:
+                task_info.load(task_info.header)
+            except Exception:
+                error_info = "Config checking failed: " \
+                    + task_info.header.path \
+                    + "\n" \
+                    + traceback.format_exc()
+                self.log.error(error_info)
+
     @staticmethod
     def _log_handler(method: Callable) -> Callable:
         def _log_wrapper(self: "Tester"):
@@ -390,7 +845,9 @@ class Tester:
             local_counter.vlog.set(self.log)
             self.log.trigger(
                 self.logs_path,
-                prefix=self.log.SUM_LOG_PREFIX,
+                prefix=self.log.SUM_LOG_PREFIX + (
+                    "" if self.shard is None else "{}-{}@".format(*self.shard)
+                ),
                 dependent=False
             )
             method(self, local_counter)
@@ -399,24 +856,205 @@ class Tester:
             Manager.pause(Tester.SHUTDOWN_INTERVAL)
         return _log_wrapper
 
+    # shared by sequential runs and parallel workers
+    # enter() is called with the manager before the task starts
+    def _evaluate(
+        self,
+        task_info: TaskInfo,
+        load: Callable[[TaskHeader], Task],
+        log: Log,
+        counter: Counter,
+        vlog: Optional[VirtualLog] = None,
+        enter: Optional[Callable[[Manager], Any]] = None
+    ) -> None:
+        with log(
+            base_path=self.logs_path,
+            ident=task_info.ident,
+            ignore=self.ignore,
+            finished=task_info.ident in self.finished
+        ) as result_exist:
+            if result_exist:
+                counter._ignore(vlog)
+                return
+
+            task, started = None, time.time()
+            try:
+                task = load(task_info.header)
+                if enter is not None:
+                    enter(task.manager)
+                passed = task()
+                counter._pass(vlog) if passed else counter._fail(vlog)
+                result = ResultStore.PASSED if passed else ResultStore.FAILED
+            except Exception:
+                counter._skip(vlog)
+                result = ResultStore.SKIPPED
+
+            self.store.record(
+                self.logs_path,
+                task_info.ident,
+                result,
+                started=started,
+                summary={} if task is None else task.summary
+            )
+
+        self.__pack(task_info, log)
+
+    # the same as _evaluate() but the task is awaited through Task.acall()
+    # and enter(), which might boot the VM, is moved to a thread
+    async def _aevaluate(
+        self,
+        task_info: TaskInfo,
+        load: Callable[[TaskHeader], Task],
+        log: Log,
+        counter: Counter,
+        vlog: Optional[VirtualLog] = None,
+        enter: Optional[Callable[[Manager], Any]] = None
+    ) -> None:
+        with log(
+            base_path=self.logs_path,
+            ident=task_info.ident,
+            ignore=self.ignore,
+            finished=task_info.ident in self.finished
+        ) as result_exist:
+            if result_exist:
+                counter._ignore(vlog)
+                return
+
+            task, started = None, time.time()
+            try:
+                task = load(task_info.header)
+                if enter is not None:
+                    await asyncio.to_thread(enter, task.manager)
+                passed = await task.acall()
+                counter._pass(vlog) if passed else counter._fail(vlog)
+                result = ResultStore.PASSED if passed else ResultStore.FAILED
+            except Exception:
+                counter._skip(vlog)
+                result = ResultStore.SKIPPED
+
+            self.store.record(
+                self.logs_path,
+                task_info.ident,
+                result,
+                started=started,
+                summary={} if task is None else task.summary
+            )
+
+        self.__pack(task_info, log)
+
+    # artefacts are all flushed once log is exited
+    def __pack(self, task_info: TaskInfo, log: Log) -> None:
+        if not self.pack:
+            return
+        try:
+            Pack.pack(os.path.join(self.logs_path, task_info.ident))
+        except Exception:
+            log.error(
+                "Packing failed; artefacts are left as they are: "
+                + task_info.ident
+                + "\n"
+                + traceback.format_exc()
+            )
+
+    # worker #0 uses the original VM, and the others use linked clones
+    def __spawn_workers(self) -> List[Worker]:
+        assert all([
+            task_info.header.type_sort.sort == TypeSort.Sort.VM
+            for task_info in self.task_info
+        ]), "Parallel workers only support VM tasks"
+
+        # all VM managers share the same vm_path
+        source: VManager = self.task_info[0].manager
+
+        workers = []
+        for index in range(self.workers):
+            vm_path = source.path if index == 0 else source._clone(index)
+            assert vm_path is not None, f"Failed to clone VM for worker #{index}"
+            workers.append(Worker(self, index, vm_path))
+        return workers
+
+    def __parallel(self, counter: Counter) -> None:
+        if len(self.task_info) == 0:
+            return
+
+        # long tasks are dispatched first to shorten the makespan
+        schedule = Scheduler(self.task_info, self.store)()
+        if self.steal:
+            tasks = LeaseQueue(self.logs_path, schedule)
+        else:
+            tasks = queue.Queue()
+            for task_info in schedule:
+                tasks.put(task_info)
+
+        workers = self.__spawn_workers()
+        try:
+            if self.asynchronous:
+                return asyncio.run(self.__gather(workers, tasks, counter))
+            with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+                futures = [executor.submit(worker, tasks, counter) for worker in workers]
+                for future in futures:
+                    future.result()
+        finally:
+            if self.steal:
+                tasks.close()
+
+    @staticmethod
+    async def __gather(
+        workers: List[Worker],
+        tasks: Union[queue.Queue, LeaseQueue],
+        counter: Counter
+    ) -> None:
+        await asyncio.gather(*[worker.acall(tasks, counter) for worker in workers])
+
+    # managers of raw tasks cannot coexist, so the last one is exited
+    # before entering another; VM managers of all types share the same VM
+    def __steal(self, counter: Counter) -> None:
+        tasks = LeaseQueue(self.logs_path, Scheduler(self.task_info, self.store)())
+
+        def enter(stack: ExitStack, manager: Manager) -> None:
+            if not manager.entered:
+                stack.close()
+                stack.enter_context(manager)
+
+        try:
+            with ExitStack() as stack:
+                while True:
+                    try:
+                        task_info: TaskInfo = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    self._evaluate(
+                        task_info,
+                        task_info.load,
+                        self.log,
+                        counter,
+                        enter=lambda manager: enter(stack, manager)
+                    )
+                    tasks.task_done(task_info)
+        finally:
+            tasks.close()
+
     # there is no need to pass counter
     # as decorator has done all for it
     @_log_handler
     def __call__(self, counter: Counter) -> None:
-        generator = self.task_group(self.logs_path, self.ignore)
+        if self.peers is not None:
+            self.store.merge(glob.glob(self.peers))
+        self.store.backfill(
+            self.logs_path,
+            [task_info.ident for task_info in self.task_info]
+        )
+        self.finished = self.store.finished(self.logs_path)
+
+        if self.workers > 1:
+            return self.__parallel(counter)
+        elif self.steal:
+            return self.__steal(counter)
+
+        generator = self.task_group(self.logs_path, self.ignore, self.finished)
         for task_info in generator if self.optimize else self.task_info:
-            with self.log(
-                base_path=self.logs_path,
-                ident=task_info.ident,
-                ignore=self.ignore
-            ) as result_exist:
-                if result_exist:
-                    counter._ignore()
-                    continue
-                try:
-                    counter._pass() if task_info() else counter._fail()
-                except Exception:
-                    counter._skip()
+            self._evaluate(task_info, task_info.load, self.log, counter)
 
     # alternative for multiple Tester(...)()
     @staticmethod
@@ -426,7 +1064,9 @@ class Tester:
             try:
                 assert isinstance(param, dict)
                 tester = Tester(**param)
-                if not check_only:
+                if check_only:
+                    tester.check()
+                else:
                     tester()
             except Exception:
                 traceback.print_exc()
@@ -14,8 +14,11 @@ from .base import GLOBAL_VLOG
 from .base import Content
 from .base import TextContent
 from .base import ImageContent
+from .base import ImagePolicy
 from .base import Message
 from .base import Model
+from .base import ResponseCache
+from .base import RateLimiter
 
 from .base import ModelType
 from .base import RoleType
@@ -45,7 +48,11 @@ from .base import Disentangled
 
 from .base import OBS
 from .base import Manager
+from .base import TaskHeader
 from .base import Task
+from .base import Manifest
+from .base import ResultStore
+from .base import Pack
 
 from .vm import VManager
 from .vm import VTask
@@ -64,6 +71,9 @@ from .Tester import Automata
 
 from .Tester import TaskInfo
 from .Tester import TaskGroup
+from .Tester import Scheduler
+from .Tester import LeaseQueue
+from .Tester import Worker
 from .Tester import Tester
 
 # DO NOT IMPORT TEMPLATE
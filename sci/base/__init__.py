@@ -13,8 +13,11 @@ from .log import GLOBAL_VLOG
 from .model import Content
 from .model import TextContent
 from .model import ImageContent
+from .model import ImagePolicy
 from .model import Message
 from .model import Model
+from .cache import ResponseCache
+from .limit import RateLimiter
 
 from .model import ModelType
 from .model import RoleType
@@ -45,4 +48,8 @@ from .community import Disentangled
 from .manager import OBS
 from .manager import Manager
 
+from .task import TaskHeader
 from .task import Task
+from .manifest import Manifest
+from .store import ResultStore
+from .pack import Pack
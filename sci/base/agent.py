@@ -1,4 +1,5 @@
 import sys
+import time
 import functools
 import string
 
@@ -12,7 +13,7 @@ sys.dont_write_bytecode = True
 from . import utils
 from .manager import OBS, Manager
 from .log import VirtualLog
-from .model import Content, TextContent, ImageContent
+from .model import Content, TextContent, ImageContent, ImagePolicy
 from .model import Message, Model
 from .utils import TypeSort
 from .prompt import CodeLike, Primitive
@@ -57,7 +58,10 @@ class Agent:
         overflow_style: Optional[str] = None,
         context_window: int = 3,
         hide_text: bool = False,
-        code_style: str = "antiquot"
+        code_style: str = "antiquot",
+        image_policy: Optional[ImagePolicy] = None,
+        stop_at_code: bool = False,
+        probe: Optional[int] = None
     ) -> None:
         assert isinstance(model, Model)
         self.model = model
@@ -72,6 +76,14 @@ class Agent:
         assert context_window >= 0
         self.context_window = context_window
 
+        # after an overflow, the shortened window is kept for the rest of
+        # the task; with probe, it grows by one after that many quiet calls
+        assert probe is None or (isinstance(probe, int) and probe > 0)
+        self.probe = probe
+        self.shrink = 0
+        self.quiet = 0
+        self.overflows = 0
+
         assert isinstance(hide_text, bool)
         self.hide_text = hide_text
 
@@ -82,6 +94,24 @@ class Agent:
             List[CodeLike]
         ] = getattr(CodeLike, handler_name)
 
+        # streamed replies are cut right after the first closing fence
+        assert isinstance(stop_at_code, bool)
+        assert not stop_at_code or model.stream, "Set stream=True for stop_at_code"
+        assert not stop_at_code or code_style in CodeLike.Fence.STYLES
+        self.stop_at_code = stop_at_code
+
+        # applied once when screenshots enter _step()
+        assert image_policy is None or isinstance(image_policy, ImagePolicy)
+        self.image_policy = ImagePolicy() if image_policy is None else image_policy
+
+        # [prompt_tokens, completion_tokens, cached_tokens], reset by Task
+        # and the number of responses whose usage is not fully reported
+        # responses replayed from ResponseCache cost nothing and are only counted
+        self.usage = [0, 0, 0]
+        self.unreported = 0
+        self.replayed = 0
+        # seconds of each model call, drained by Task at every step
+        self.timing: List[float] = []
         self.vlog = VirtualLog()
 
     def _init(self, inst: str) -> None:
@@ -89,6 +119,8 @@ class Agent:
             role="system",
             content=[TextContent(inst.strip())]
         )
+        # the same in every payload of the task, so dumped only once
+        self.system_payload: Dict[str, Any] = self.system_message._asdict()
         self.context: List[Message] = []
 
     @staticmethod
@@ -117,23 +149,62 @@ class Agent:
 
     def dump_payload(self, context_length: int) -> Dict:
         payload = self.__dump(context_length * 2 + 1)
-        return [message._asdict(hide_text=(
+        return [self.system_payload, *[message._asdict(hide_text=(
+            not index + 1 == len(payload) and self.hide_text
+        )) for index, message in enumerate(payload) if index > 0]]
+
+    # largest context_length whose payload is estimated to fit max_context
+    # with max_tokens left for the reply; system message and the newest
+    # user message are always sent, even if they alone are too long
+    def __fit(self, context_length: int) -> int:
+        if self.model.max_context is None:
+            return context_length
+
+        budget = self.model.max_context - (self.model.max_tokens or 0)
+        payload = self.__dump(context_length * 2 + 1)
+        tokens = [message._tokens(hide_text=(
             not index + 1 == len(payload) and self.hide_text
         )) for index, message in enumerate(payload)]
 
-    def dump_history(self, hide: bool) -> Tuple[Dict, Dict]:
+        total = tokens[0] + tokens[-1]
+        history = tokens[-2:0:-1]
+        for count in range(context_length):
+            pair = history[count * 2:count * 2 + 2]
+            if len(pair) == 0:
+                break
+            if (total := total + sum(pair)) > budget:
+                self.vlog.info(
+                    f"Estimated more than {budget} tokens for {self.model.model_name}; "
+                    f"set context_window={count}."
+                )
+                return count
+        return context_length
+
+    # only messages in [start, end) of [system, *context] are dumped
+    # so that Log.save() can append new ones in background
+    def dump_history(
+        self,
+        hide: bool,
+        start: int = 0,
+        end: Optional[int] = None,
+        image_ref: Optional[Callable[[ImageContent], str]] = None
+    ) -> List[Dict]:
         return [
-            message._asdict(show_context=True, hide_text=hide, hide_image=hide)
-            for message in self.__dump(len(self.context))
+            message._asdict(
+                show_context=True,
+                hide_text=hide,
+                hide_image=hide,
+                image_ref=image_ref
+            )
+            for message in self.__dump(len(self.context))[start:end]
         ]
 
-    def __call__(
+    def __prepare(
         self,
         contents: List[Content],
-        shorten: int = 0,
-        retry: int = 3,
-        timeout: int = Manager.HETERO_TIMEOUT
-    ) -> Message:
+        shorten: int,
+        retry: int
+    ) -> int:
         assert hasattr(self, "context"), "Call _init() first"
         assert retry > 0, f"Max retries exceeded when calling {self.model.model_name}"
 
@@ -141,21 +212,35 @@ class Agent:
         for content in contents:
             assert isinstance(content, Content)
 
-        context_length = self.context_window - shorten
+        context_length = self.context_window - max(shorten, self.shrink)
         assert context_length >= 0, "Error when calculating context length"
 
         self.context.append(self.model.message(role="user", content=contents))
-        response = self.model(self.dump_payload(context_length), timeout)
+        return self.__fit(context_length)
 
+    # shared by __call__() and acall(); return None as message to retry
+    # with user message popped and (shorten, retry) updated
+    def __digest(
+        self,
+        response: Response,
+        context_length: int,
+        shorten: int,
+        retry: int
+    ) -> Tuple[Optional[Message], int, int]:
         is_overflow = False if self.overflow_handler is None \
             else self.overflow_handler(response)
 
-        if is_overflow and context_length > 0:
+        # windows longer than the history are not shortened one by one
+        sent_length = min(context_length, (len(self.context) - 1) // 2)
+        if is_overflow and sent_length > 0:
+            self.shrink = self.context_window - sent_length + 1
+            self.quiet = 0
+            self.overflows += 1
             self.vlog.error(
                 f"Overflow detected when requesting {self.model.model_name}; "
-                f"set context_window={context_length - 1}."
+                f"set context_window={sent_length - 1} for the rest of the task."
             )
-            return self(self.context.pop().content, shorten + 1, retry, timeout)
+            return None, self.shrink, retry
         assert not is_overflow, f"Unsolvable overflow when requesting {self.model.model_name}"
 
         response_message = self.model.access(response, context_length)
@@ -165,11 +250,91 @@ class Agent:
                     + f" with status code of {response.status_code}.\n"
                     + response.text
             )
-            Manager.pause(Primitive.WAIT_TIME)
-            return self(self.context.pop().content, shorten, retry - 1, timeout)
+            return None, shorten, retry - 1
+
+        if getattr(response, "from_cache", False):
+            self.replayed += 1
+        else:
+            usage = self.model.usage(response)
+            if None in usage:
+                self.unreported += 1
+            for index, tokens in enumerate(usage):
+                self.usage[index] += tokens or 0
+
+        self.quiet += 1
+        if self.probe is not None and self.shrink > 0 and self.quiet >= self.probe:
+            self.shrink -= 1
+            self.quiet = 0
+            self.vlog.info(
+                f"Probing context_window={self.context_window - self.shrink} "
+                f"for {self.model.model_name}."
+            )
 
         self.context.append(response_message)
-        return response_message
+        return response_message, shorten, retry
+
+    def __call__(
+        self,
+        contents: List[Content],
+        shorten: int = 0,
+        retry: int = 3,
+        timeout: int = Manager.HETERO_TIMEOUT
+    ) -> Message:
+        context_length = self.__prepare(contents, shorten, retry)
+        started = time.monotonic()
+        response = self.model(
+            self.dump_payload(context_length),
+            timeout,
+            CodeLike.Fence() if self.stop_at_code else None
+        )
+        self.timing.append(time.monotonic() - started)
+
+        response_message, new_shorten, new_retry = self.__digest(
+            response,
+            context_length,
+            shorten,
+            retry
+        )
+        if response_message is not None:
+            return response_message
+
+        if new_retry < retry:
+            Manager.pause(Primitive.WAIT_TIME)
+        return self(self.context.pop().content, new_shorten, new_retry, timeout)
+
+    async def acall(
+        self,
+        contents: List[Content],
+        shorten: int = 0,
+        retry: int = 3,
+        timeout: int = Manager.HETERO_TIMEOUT
+    ) -> Message:
+        context_length = self.__prepare(contents, shorten, retry)
+        started = time.monotonic()
+        response = await self.model.acall(
+            self.dump_payload(context_length),
+            timeout,
+            CodeLike.Fence() if self.stop_at_code else None
+        )
+        self.timing.append(time.monotonic() - started)
+
+        response_message, new_shorten, new_retry = self.__digest(
+            response,
+            context_length,
+            shorten,
+            retry
+        )
+        if response_message is not None:
+            return response_message
+
+        if new_retry < retry:
+            await Manager.apause(Primitive.WAIT_TIME)
+        return await self.acall(
+            self.context.pop().content,
+            new_shorten,
+            new_retry,
+            timeout
+        )
 
 
 class AIOAgent(Agent):
@@ -221,7 +386,7 @@ class AIOAgent(Agent):
             item for _, item in obs.items()
             if isinstance(item, Image.Image)
         ]
-        contents += [ImageContent(image) for image in images]
+        contents += [self.image_policy(image) for image in images]
         return contents
 
 
@@ -297,5 +462,5 @@ class ActorAgent(AIOAgent):
             item for _, item in obs.items()
             if isinstance(item, Image.Image)
         ]
-        contents += [ImageContent(image) for image in images]
+        contents += [self.image_policy(image) for image in images]
         return contents
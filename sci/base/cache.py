@@ -0,0 +1,156 @@
+import sys
+import os
+import json
+import uuid
+import hashlib
+import threading
+
+from typing import Optional, List, Tuple, Dict, Any
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+sys.dont_write_bytecode = True
+
+# content-addressed responses of models on local disk
+# - key: sha256 of canonical payload where images are replaced by digests
+# - entries are touched when hit and least recently used ones are evicted
+#   once the total size exceeds max_size bytes
+# - replay: requests are never sent, and a miss fails the step
+# only responses that Model.access() accepts are stored
+class ResponseCache:
+    SUFFIX = ".json"
+    IMAGE_KEYS = {"url", "data", "image_base64"}
+    HEADERS = {"content-type", "retry-after"}
+
+    def __init__(
+        self,
+        cache_path: str,
+        max_size: int = 1 << 30,
+        replay: bool = False
+    ) -> None:
+        assert isinstance(cache_path, str)
+        assert isinstance(max_size, int) and max_size > 0
+        self.cache_path = os.path.expanduser(cache_path)
+        self.max_size = max_size
+        self.replay = replay
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.size = sum(size for _, _, size in self.__entries())
+        self.hits = 0
+        self.misses = 0
+
+    # base64 of images is replaced by its digest, so that keys are cheap
+    # to build and stay the same as long as encoded bytes are the same
+    @staticmethod
+    def __canonical(obj: Any, key: Optional[str] = None) -> Any:
+        if isinstance(obj, dict):
+            return {
+                sub_key: ResponseCache.__canonical(value, sub_key)
+                for sub_key, value in obj.items()
+            }
+        elif isinstance(obj, list):
+            return [ResponseCache.__canonical(item) for item in obj]
+        elif isinstance(obj, str) and key in ResponseCache.IMAGE_KEYS:
+            digest = hashlib.sha256(obj.encode("utf-8")).hexdigest()
+            return f"sha256:{digest}"
+        else:
+            return obj
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        canonical = json.dumps(
+            ResponseCache.__canonical(payload),
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.cache_path, key[:2], key + ResponseCache.SUFFIX)
+
+    # (file_path, mtime, size) of every entry
+    def __entries(self) -> List[Tuple[str, float, int]]:
+        entries = []
+        for dir_path, _, filenames in os.walk(self.cache_path):
+            for filename in filenames:
+                if not filename.endswith(ResponseCache.SUFFIX):
+                    continue
+                file_path = os.path.join(dir_path, filename)
+                try:
+                    stat = os.stat(file_path)
+                    entries.append((file_path, stat.st_mtime, stat.st_size))
+                except FileNotFoundError:
+                    continue
+        return entries
+
+    def get(self, key: str) -> Optional[Response]:
+        file_path = self.__path(key)
+        try:
+            with open(file_path, mode="r", encoding="utf-8") as readable:
+                entry = json.load(readable)
+            os.utime(file_path)
+        except:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        response = Response()
+        response.status_code = entry["status_code"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = "utf-8"
+        response._content = entry["content"].encode("utf-8")
+        response.cache_key = key
+        response.from_cache = True
+        with self.lock:
+            self.hits += 1
+        return response
+
+    # written to a temporary file first so that readers in other processes
+    # never see half of an entry; failures of the cache never fail a step
+    def put(self, key: str, response: Response) -> None:
+        file_path = self.__path(key)
+        temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(temp_path, mode="w", encoding="utf-8") as writable:
+                json.dump({
+                    "status_code": response.status_code,
+                    "headers": {
+                        name: value
+                        for name, value in response.headers.items()
+                        if name.lower() in ResponseCache.HEADERS
+                    },
+                    "content": response.content.decode("utf-8")
+                }, writable, ensure_ascii=False)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, file_path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self.lock:
+            self.size += size
+            if self.size > self.max_size:
+                self.__evict()
+
+    # oldest entries go first until the cache is back to 90% of max_size
+    def __evict(self) -> None:
+        entries = sorted(self.__entries(), key=lambda entry: entry[1])
+        self.size = sum(size for _, _, size in entries)
+        target = self.max_size * 0.9
+        for file_path, _, size in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": self.size}
@@ -1,5 +1,8 @@
 import sys
 import re
+import copy
+import asyncio
+import dataclasses
 
 from typing import List, Tuple, Dict
 from typing import Optional, Any, Self
@@ -11,6 +14,7 @@ from .log import VirtualLog
 from .agent import Agent, AIOAgent
 from .agent import PlannerAgent, GrounderAgent
 from .agent import CoderAgent, ActorAgent
+from .model import Content, Message
 from .prompt import TypeSort, CodeLike
 
 
@@ -27,6 +31,15 @@ class Community:
             if isinstance(getattr(self, key), Agent)
         ]
 
+    # agents keep their context inside, so each parallel worker needs
+    # its own copy of them; models are shared as they are stateless
+    def fork(self) -> Self:
+        forked = {}
+        for key, agent in self.agents:
+            forked[key] = copy.copy(agent)
+            forked[key].vlog = VirtualLog()
+        return dataclasses.replace(self, **forked)
+
     def __iter__(self) -> Self:
         self.iter_pointer = 0
         return self
@@ -50,32 +63,40 @@ class Community:
     ) -> List[CodeLike]:
         raise NotImplementedError
 
+    # fall back to a thread for communities without a native async one
+    async def acall(self, **kwargs) -> List[CodeLike]:
+        return await asyncio.to_thread(self, **kwargs)
+
 
 @dataclass
 class AllInOne(Community):
     mono: AIOAgent
 
-    def __call__(
+    def __prepare(
         self,
         steps: Tuple[int, int],
         inst: str,
         obs: Dict[str, Any],
         code_info: tuple[set[str], Optional[List[List[int]]]],
         type_sort: TypeSort,
-        timeout: int,
         manager: Manager
-    ) -> List[CodeLike]:
-        step_index, total_steps = steps
+    ) -> List[Content]:
+        step_index, _ = steps
         init_kwargs = {
             "inst": inst,
             "type_sort": type_sort,
             "primitives": code_info[0],
             "manager": manager
         } if step_index == 0 else None
+        return self.mono._step(obs, init_kwargs)
 
-        user_content = self.mono._step(obs, init_kwargs)
-        response_message = self.mono(user_content, timeout=timeout)
-
+    def __digest(
+        self,
+        steps: Tuple[int, int],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        response_message: Message
+    ) -> List[CodeLike]:
+        step_index, total_steps = steps
         assert len(response_message.content) == 1
         response_content = response_message.content[0]
 
@@ -85,6 +106,34 @@ class AllInOne(Community):
         )
         return self.mono.code_handler(response_content, *code_info)
 
+    def __call__(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int,
+        manager: Manager
+    ) -> List[CodeLike]:
+        user_content = self.__prepare(steps, inst, obs, code_info, type_sort, manager)
+        response_message = self.mono(user_content, timeout=timeout)
+        return self.__digest(steps, code_info, response_message)
+
+    async def acall(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int,
+        manager: Manager
+    ) -> List[CodeLike]:
+        user_content = self.__prepare(steps, inst, obs, code_info, type_sort, manager)
+        response_message = await self.mono.acall(user_content, timeout=timeout)
+        return self.__digest(steps, code_info, response_message)
+
 
 @dataclass
 class SeeAct(Community):
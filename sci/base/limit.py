@@ -0,0 +1,152 @@
+import sys
+import os
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+import email.utils
+
+from typing import Optional, Dict, ClassVar
+
+from requests import Response
+
+sys.dont_write_bytecode = True
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# token bucket of requests shared by every model with the same base_url
+# - in a process: one limiter per base_url, see RateLimiter.get()
+# - across processes: the bucket lives in a lock file under STATE_PATH
+#   on platforms without fcntl, it is shared within the process only
+# hold() pauses everyone sharing the bucket, e.g. after 429
+class RateLimiter:
+    STATE_PATH = os.path.join(tempfile.gettempdir(), "sci-limits")
+    SUFFIX = ".json"
+
+    LIMITERS: ClassVar[Dict[str, "RateLimiter"]] = {}
+    REGISTRY_LOCK: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, base_url: str, rpm: float, burst: Optional[int] = None) -> None:
+        assert isinstance(base_url, str)
+        assert rpm > 0
+        assert burst is None or burst > 0
+        self.base_url = base_url
+        self.rate = rpm / 60
+        self.burst = max(1, round(rpm / 60)) if burst is None else burst
+
+        digest = hashlib.sha1(base_url.encode("utf-8")).hexdigest()
+        self.file_path = os.path.join(RateLimiter.STATE_PATH, digest + RateLimiter.SUFFIX)
+        self.lock = threading.Lock()
+        self.state = {"tokens": float(self.burst), "stamp": time.time(), "until": 0.0}
+
+    # limiters are registered by base_url; the stricter rpm and burst win
+    # and are applied in place, as models may hold the limiter already
+    @staticmethod
+    def get(base_url: str, rpm: float, burst: Optional[int] = None) -> "RateLimiter":
+        with RateLimiter.REGISTRY_LOCK:
+            limiter = RateLimiter.LIMITERS.get(base_url)
+            if limiter is None:
+                limiter = RateLimiter(base_url, rpm, burst)
+                RateLimiter.LIMITERS[base_url] = limiter
+            else:
+                limiter.tighten(rpm, burst)
+            return limiter
+
+    def tighten(self, rpm: float, burst: Optional[int] = None) -> None:
+        assert rpm > 0
+        assert burst is None or burst > 0
+        with self.lock:
+            self.rate = min(self.rate, rpm / 60)
+            self.burst = min(
+                self.burst,
+                max(1, round(rpm / 60)) if burst is None else burst
+            )
+
+    # state is read, changed and written back under both locks
+    def __update(self, handler) -> float:
+        with self.lock:
+            if fcntl is None:
+                return handler(self.state)
+
+            os.makedirs(RateLimiter.STATE_PATH, exist_ok=True)
+            with open(self.file_path, mode="a+", encoding="utf-8") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    file.seek(0)
+                    try:
+                        self.state = json.loads(file.read())
+                    except:
+                        pass
+                    result = handler(self.state)
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(self.state))
+                    file.flush()
+                    return result
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    # seconds to wait before the next try; 0 if a token is taken
+    def __take(self, state: Dict[str, float]) -> float:
+        now = time.time()
+        if state["until"] > now:
+            return state["until"] - now
+
+        elapsed = max(now - state["stamp"], 0)
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * self.rate)
+        state["stamp"] = now
+        if state["tokens"] >= 1:
+            state["tokens"] -= 1
+            return 0.0
+        return (1 - state["tokens"]) / self.rate
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while (span := self.__update(self.__take)) > 0:
+            time.sleep(span)
+            waited += span
+        return waited
+
+    def hold(self, span: float) -> None:
+        def handler(state: Dict[str, float]) -> float:
+            state["until"] = max(state["until"], time.time() + span)
+            state["tokens"] = 0.0
+            return span
+        self.__update(handler)
+
+
+# exponential backoff with jitter unless the server says how long
+# Retry-After is honoured as is; CAP only bounds the fallback
+# 529 is sent by anthropic when it is overloaded
+class Backoff:
+    BASE = 2.0
+    CAP = 60.0
+    STATUS = {429, 503, 529}
+
+    @staticmethod
+    def retry_after(response: Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            moment = email.utils.parsedate_to_datetime(value)
+            return max(moment.timestamp() - time.time(), 0.0)
+        except:
+            return None
+
+    @staticmethod
+    def delay(response: Response, attempt: int) -> float:
+        hint = Backoff.retry_after(response)
+        if hint is not None:
+            return hint
+        span = min(Backoff.CAP, Backoff.BASE * 2 ** attempt)
+        return span / 2 + random.uniform(0, span / 2)
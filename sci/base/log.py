@@ -1,17 +1,26 @@
 import logging
 import os
+import inspect
 import re
 import json
+import queue
+import base64
+import shutil
 import random
 import string
+import threading
+import traceback
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from typing import Union, Optional, List, Set, Dict, Any
 from typing import Callable, Self, TYPE_CHECKING
 
 from PIL import Image
 
+from .model import ImageContent
+from .pack import Pack
+
 if TYPE_CHECKING:
     from .task import Task
     from .agent import CodeLike
@@ -21,6 +30,62 @@ if TYPE_CHECKING:
 GLOBAL_VLOG = None
 HAVE_CALLED = False
 
+# writes step artefacts off the critical path of Task._step()
+# - jobs run in order on one daemon thread, so appends keep their order
+# - submit() blocks once maxsize jobs are pending, as backpressure
+# - flush() waits for pending jobs, fsyncs files written since the last
+#   flush, and returns errors met by jobs in the meanwhile
+# jobs run in place when maxsize is 0
+class Writer:
+    def __init__(self, maxsize: int) -> None:
+        assert isinstance(maxsize, int) and maxsize >= 0
+        self.maxsize = maxsize
+        self.jobs: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.touched: Set[str] = set()
+        self.errors: List[str] = []
+
+    # handlers may return the path they actually wrote
+    def __run(self, file_path: str, handler: Callable[[], Optional[str]]) -> None:
+        try:
+            self.touched.add(handler() or file_path)
+        except:
+            self.errors.append(traceback.format_exc())
+
+    def __loop(self) -> None:
+        while True:
+            file_path, handler = self.jobs.get()
+            self.__run(file_path, handler)
+            self.jobs.task_done()
+
+    def submit(self, file_path: str, handler: Callable[[], Optional[str]]) -> None:
+        if self.maxsize == 0:
+            return self.__run(file_path, handler)
+
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__loop, daemon=True)
+                self.thread.start()
+        self.jobs.put((file_path, handler))
+
+    def flush(self) -> List[str]:
+        self.jobs.join()
+        for file_path in self.touched:
+            try:
+                descriptor = os.open(file_path, os.O_RDONLY)
+                try:
+                    os.fsync(descriptor)
+                finally:
+                    os.close(descriptor)
+            except FileNotFoundError:
+                continue
+        self.touched.clear()
+
+        errors, self.errors = self.errors, []
+        return errors
+
+
 class Log:
     # IGNORE: refuse all calls outside of Log.log()
     # NATURALIZATION: print output in ways of Log
@@ -75,15 +140,22 @@ class Log:
     def __timestamp(self) -> str:
         return datetime.now().strftime(self.TIMESTAMP_PATTERN)
 
-    IMAGE_FILENAME   = "step_{index}@{timestamp}.png"
     TEXT_FILENAME    = "step_{index}@{timestamp}.txt"
+    BLOB_DIRNAME     = "blobs"
+    BLOB_FILENAME    = "{digest}.{format}"
 
     TRAJ_FILENAME    = "traj.jsonl"
     RESULT_FILENAME  = "result.out"
     RECORD_FILENAME  = "record.mp4"
-    REQUEST_FILENAME = "request_{agent}.json"
-    SIMP_FILENAME    = "request_{agent}.simp.json"
+    REQUEST_FILENAME = "request_{agent}.jsonl"
+    SIMP_FILENAME    = "request_{agent}.simp.jsonl"
+    REQUEST_VIEW     = "request_{agent}.json"
+    SIMP_VIEW        = "request_{agent}.simp.json"
     PROMPT_FILENAME  = "prompt_{agent}.txt"
+    SUMMARY_FILENAME = "summary.json"
+
+    # pending jobs of the background writer; 0 to write in place
+    WRITER_SIZE = 16
 
     @property
     def save_path(self) -> Optional[str]:
@@ -110,6 +182,11 @@ class Log:
         assert self.file_handler is not None
         return os.path.join(self.save_path, self.RECORD_FILENAME)
 
+    @property
+    def summary_file_path(self) -> str:
+        assert self.file_handler is not None
+        return os.path.join(self.save_path, self.SUMMARY_FILENAME)
+
     @property
     def request_file_path(self) -> str:
         assert self.file_handler is not None
@@ -125,6 +202,11 @@ class Log:
         assert self.file_handler is not None
         return os.path.join(self.save_path, self.PROMPT_FILENAME)
 
+    @property
+    def blob_path(self) -> str:
+        assert self.file_handler is not None
+        return os.path.join(self.save_path, self.BLOB_DIRNAME)
+
     def __init__(
         self,
         level: int = logging.INFO,
@@ -159,6 +241,8 @@ class Log:
             self.__add_stream_handler()
 
         self.file_handler = None
+        self.writer = Writer(self.WRITER_SIZE)
+        self.request_counts: Dict[str, int] = {}
         self._registered = []
         self._independent = []
         self.register_callback = None
@@ -204,6 +288,7 @@ class Log:
     # so callback() should be manually called by its owner
     # or use with(callback=True) block
     def callback(self) -> None:
+        self.flush()
         for file_handler in self._independent:
             self.__remove_file_handler(file_handler)
 
@@ -279,8 +364,9 @@ class Log:
             dependent=dependent
         )
 
+    # finished is probed from result.out if not given by the caller
     def __clear(self, ignore: bool) -> bool:
-        if os.path.exists(self.result_file_path) and ignore:
+        if self.finished and ignore:
             return
 
         for filename in os.listdir(self.save_path):
@@ -289,6 +375,8 @@ class Log:
             # so there might be dirs in extreme cases
             if os.path.isfile(file_path) and not filename.endswith(".log"):
                 os.remove(file_path)
+            elif filename == self.BLOB_DIRNAME and os.path.isdir(file_path):
+                shutil.rmtree(file_path)
             # automatically add LEGACY_MARKER to old log file
             elif os.path.isfile(file_path) \
                 and not filename.startswith(self.LEGACY_MARKER) \
@@ -307,7 +395,8 @@ class Log:
         base_path: str,
         ident: Optional[str] = None,
         callback: bool = False,
-        ignore: bool = True
+        ignore: bool = True,
+        finished: Optional[bool] = None
     ) -> Self:
         assert self.register_callback == None, (
             "__call__() should not be called twice "
@@ -321,20 +410,31 @@ class Log:
         self.trigger(os.path.join(base_path, ident))
         self.extra["domain"] = self.DEFAULT_DOMAIN if ident is None else ident
 
+        assert isinstance(finished, bool) or finished is None
+        self.finished = Pack.exists(self.save_path, self.RESULT_FILENAME) \
+            if finished is None else finished
+
+        # result.out is removed by __clear() if not ignored
         assert isinstance(ignore, bool)
         self.__clear(ignore)
+        self.finished = self.finished and ignore
 
         assert isinstance(callback, bool)
         self.register_callback = callback
+
+        # messages of each agent already appended to request logs
+        self.request_counts: Dict[str, int] = {}
         return self
 
     def __enter__(self) -> bool:
-        return os.path.exists(self.result_file_path)
+        return self.finished
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         assert isinstance(self.register_callback, bool)
         if self.register_callback:
             self.callback()
+        else:
+            self.flush()
         self.register_callback = None
 
         self.__remove_file_handler()
@@ -355,7 +455,7 @@ class Log:
         codes: List["CodeLike"],
         community: "Community",
         is_textual: bool
-    ) -> None:
+    ) -> Dict[str, Any]:
         assert self.save_path is not None, "Call trigger() first"
 
         timestamp = self.__timestamp
@@ -371,12 +471,6 @@ class Log:
         )
         text_file_path = os.path.join(self.save_path, text_filename)
 
-        image_filename = self.IMAGE_FILENAME.format(
-            index=step_index,
-            timestamp=timestamp
-        )
-        image_file_path = os.path.join(self.save_path, image_filename)
-
         # save textual/a11y_tree to new file
         filtered_text = [
             item for item in obs.values()
@@ -385,56 +479,197 @@ class Log:
         if len(filtered_text) == 1:
             key_name = "textual" if is_textual else "a11y_tree"
             traj_obj[key_name] = text_filename
-            with open(text_file_path, mode="w", encoding="utf-8") as writable:
-                writable.write(filtered_text[0])
-
-        # save screenshot (or SoM screenshot) to new file
+            self.writer.submit(text_file_path, Log.__write(
+                text_file_path,
+                filtered_text[0]
+            ))
+
+        # save screenshot (or SoM screenshot) as a blob
+        # it is hashed by writer and traj_obj is filled then,
+        # which is always before trace() serializes traj_obj
         filtered_image = [
             item for item in obs.values()
             if isinstance(item, Image.Image)
         ]
         if len(filtered_image) == 1:
-            traj_obj["screenshot"] = image_filename
-            filtered_image[0].save(image_file_path)
-
-        # save trajetories by appending previous records
-        with open(self.traj_file_path, mode="a", encoding="utf-8") as appendable:
-            appendable.write(json.dumps(traj_obj, ensure_ascii=False) + "\n")
-
-        # save requests by overwriting previous record
+            content = Log.__encoded(filtered_image[0], community)
+            def handler() -> str:
+                traj_obj["screenshot"] = self.__blob(content)
+                return os.path.join(self.save_path, traj_obj["screenshot"])
+            self.writer.submit(self.blob_path, handler)
+
+        # save requests by appending new messages only
+        # each line is {"index": ..., **message} of [system, *context]
+        # and images are replaced by names of blobs
         for name, agent in community:
-            full_request = agent.dump_history(False)
-            simp_request = agent.dump_history(True)
-            with open(
-                self.request_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                json.dump(
-                    full_request,
-                    writable,
-                    ensure_ascii=False,
-                    indent=2
-                )
+            start = self.request_counts.get(name, 0)
+            end = len(agent.context) + 1
+            self.request_counts[name] = end
+
+            for file_path, hide in (
+                (self.request_file_path, False),
+                (self.simp_file_path, True)
+            ):
+                file_path = file_path.format(agent=name)
+                self.writer.submit(file_path, Log.__write(
+                    file_path,
+                    lambda agent=agent, hide=hide, start=start, end=end: "".join([
+                        json.dumps(
+                            {"index": start + offset, **message},
+                            ensure_ascii=False
+                        ) + "\n"
+                        for offset, message in enumerate(agent.dump_history(
+                            hide,
+                            start,
+                            end,
+                            image_ref=self.__blob
+                        ))
+                    ]),
+                    mode="a"
+                ))
+
+            if start == 0 and end > 0:
+                file_path = self.prompt_file_path.format(agent=name)
+                self.writer.submit(file_path, Log.__write(
+                    file_path,
+                    agent.system_message.content[0].text
+                ))
+
+        # trajectory is appended by trace() when the step ends
+        return traj_obj
+
+    # content can be given lazily, so that it is serialized by writer
+    @staticmethod
+    def __write(
+        file_path: str,
+        content: Union[str, Callable[[], str]],
+        mode: str = "w"
+    ) -> Callable[[], None]:
+        def handler() -> None:
+            with open(file_path, mode=mode, encoding="utf-8") as writable:
+                writable.write(content if isinstance(content, str) else content())
+        return handler
 
-            with open(
-                self.simp_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                json.dump(
-                    simp_request,
-                    writable,
-                    ensure_ascii=False,
-                    indent=2
-                )
+    # images are stored once under blobs/ by sha256 of their encoded bytes
+    # so that repeated screenshots and images in requests share a file;
+    # names relative to save_path are returned to be put in logs
+    # content sent to models is reused if the image policy has left
+    # the screenshot as it is, so that it is encoded only once
+    @staticmethod
+    def __encoded(image: Image.Image, community: "Community") -> ImageContent:
+        for _, agent in community:
+            for message in agent.context[-2:]:
+                for content in message.content:
+                    if isinstance(content, ImageContent) \
+                        and content.image is image \
+                        and content.format == "png" \
+                        and content.quality is None:
+                        return content
+        return ImageContent(image)
+
+    def __blob(self, content: ImageContent) -> str:
+        filename = self.BLOB_FILENAME.format(
+            digest=content.digest,
+            format=content.format
+        )
+        blob_file_path = os.path.join(self.blob_path, filename)
+        if not os.path.exists(blob_file_path):
+            os.makedirs(self.blob_path, exist_ok=True)
+            temp_file_path = f"{blob_file_path}.tmp"
+            with open(temp_file_path, mode="wb") as writable:
+                writable.write(content.buffer)
+            os.replace(temp_file_path, blob_file_path)
+        return f"{self.BLOB_DIRNAME}/{filename}"
+
+    # wait for the writer; errors of its jobs are logged but never raised
+    def flush(self) -> None:
+        for error in self.writer.flush():
+            self.error(f"Failed to write logs: {error}")
+
+    # save trajetories by appending previous records
+    def trace(self, traj_obj: Dict[str, Any]) -> None:
+        self.writer.submit(self.traj_file_path, Log.__write(
+            self.traj_file_path,
+            lambda: json.dumps(traj_obj, ensure_ascii=False) + "\n",
+            mode="a"
+        ))
+
+    def summarize(self, summary: Dict[str, Any]) -> None:
+        self.writer.submit(self.summary_file_path, Log.__write(
+            self.summary_file_path,
+            lambda: json.dumps(summary, ensure_ascii=False, indent=2)
+        ))
+
+    # names of blobs are turned back into base64 when inline is set
+    @staticmethod
+    def __inline(save_path: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        prefix = Log.BLOB_DIRNAME + "/"
+        def load(name: str, data_url: bool) -> str:
+            if not name.startswith(prefix):
+                return name
+            with Pack.open(save_path, name) as readable:
+                data = base64.b64encode(readable.read()).decode()
+            format = os.path.splitext(name)[1][1:]
+            return f"data:image/{format};base64,{data}" if data_url else data
+
+        for content in message["content"]:
+            if content.get("type") == "image_url":
+                content["image_url"]["url"] = load(content["image_url"]["url"], True)
+            elif content.get("type") == "image":
+                content["source"]["data"] = load(content["source"]["data"], False)
+            elif "image_base64" in content:
+                content["image_base64"] = load(content["image_base64"], True)
+        return message
+
+    # the list that request_{agent}.json used to hold
+    # later lines win if a message is appended twice
+    # packed tasks are read in place, see Pack
+    @staticmethod
+    def read_requests(
+        save_path: str,
+        agent: str,
+        simp: bool = False,
+        inline: bool = True
+    ) -> List[Dict]:
+        filename = (Log.SIMP_FILENAME if simp else Log.REQUEST_FILENAME).format(agent=agent)
+        messages = {}
+        with Pack.open(save_path, filename) as readable:
+            for line in readable.read().decode("utf-8").splitlines():
+                if len(line.strip()) > 0:
+                    message = json.loads(line)
+                    messages[message.pop("index")] = message
+        return [
+            Log.__inline(save_path, messages[index]) if inline else messages[index]
+            for index in sorted(messages)
+        ]
 
-            with open(
-                self.prompt_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                writable.write(full_request[0]["content"][0]["text"])
+    # usage: Log.rebuild_requests("logs/VM/Mock-00000")
+    # writes request_{agent}.json and .simp.json for every agent found
+    @staticmethod
+    def rebuild_requests(save_path: str) -> List[str]:
+        prefix, suffix = Log.REQUEST_FILENAME.split("{agent}")
+        agents = [
+            filename[len(prefix):-len(suffix)]
+            for filename in Pack.listdir(save_path)
+            if filename.startswith(prefix)
+                and filename.endswith(suffix)
+                and not filename.endswith(Log.SIMP_FILENAME.split("{agent}")[1])
+        ]
+
+        for agent in agents:
+            for simp, view in ((False, Log.REQUEST_VIEW), (True, Log.SIMP_VIEW)):
+                with open(
+                    os.path.join(save_path, view.format(agent=agent)),
+                    mode="w",
+                    encoding="utf-8"
+                ) as writable:
+                    json.dump(
+                        Log.read_requests(save_path, agent, simp),
+                        writable,
+                        ensure_ascii=False,
+                        indent=2
+                    )
+        return agents
 
     # should not be set as protected method
     # as they will be used by Task objects
@@ -446,6 +681,8 @@ class Log:
             stop_args: List[str]
         ) -> bool:
             return_value = method(self, stop_type, stop_args)
+            # result.out marks the task as finished, so artefacts go first
+            self.vlog.flush()
             with open(
                 self.vlog.result_file_path,
                 mode="w",
@@ -462,7 +699,17 @@ class Log:
             return_value = method(self)
             self.manager.record_stop(self.vlog.record_file_path)
             return return_value
-        return record_wrapper
+
+        # for Task.apredict()
+        async def arecord_wrapper(self: "Task") -> bool:
+            self.manager.record_start()
+            return_value = await method(self)
+            self.manager.record_stop(self.vlog.record_file_path)
+            return return_value
+
+        return arecord_wrapper \
+            if inspect.iscoroutinefunction(method) \
+            else record_wrapper
 
     # use log.info() directly instead of self.adapter.info()
     # WARNING:
@@ -2,6 +2,7 @@ import sys
 import os
 import re
 import time
+import asyncio
 import tempfile
 
 from typing import Union, Tuple, Optional
@@ -39,6 +40,10 @@ class Manager:
     def pause(span: Optional[int] = None) -> None:
         time.sleep(Manager.ACTION_INTERVAL if span is None else span)
 
+    @staticmethod
+    async def apause(span: Optional[int] = None) -> None:
+        await asyncio.sleep(Manager.ACTION_INTERVAL if span is None else span)
+
     def __init__(self, version: str) -> None:
         self.entered = False
         self.vlog = VirtualLog()
@@ -103,6 +108,20 @@ class Manager:
         """a screenshot with interact-able elements marked with numerical tags"""
         raise NotImplementedError
 
+    # async variants of observations for Task.apredict()
+    # blocking calls are moved to threads to keep event loop free
+    async def atextual(self) -> Union[str, NoReturn]:
+        return await asyncio.to_thread(self.textual)
+
+    async def ascreenshot(self) -> Union[Image.Image, NoReturn]:
+        return await asyncio.to_thread(self.screenshot)
+
+    async def aa11y_tree(self) -> Union[str, NoReturn]:
+        return await asyncio.to_thread(self.a11y_tree)
+
+    async def aset_of_marks(self) -> Union[Tuple[Image.Image, str], NoReturn]:
+        return await asyncio.to_thread(self.set_of_marks)
+
     def record_start(self) -> None:
         if self.is_gui:
             self.vlog.warning("record_start() is not implemented.")
@@ -0,0 +1,83 @@
+import sys
+import os
+import json
+import socket
+import dataclasses
+
+from typing import Dict, Set, Any
+
+sys.dont_write_bytecode = True
+from .task import TaskHeader
+from .utils import error_factory
+
+# cached headers of all configs under tasks_path, stored next to them
+# an entry is re-read only if mtime or size of its config changes
+class Manifest:
+    FILENAME = ".manifest.json"
+    VERSION = 1
+
+    def __init__(self, base_path: str) -> None:
+        assert isinstance(base_path, str)
+        assert os.path.isdir(base_path)
+        self.base_path = base_path
+        self.file_path = os.path.join(base_path, Manifest.FILENAME)
+
+        self.entries: Dict[str, Dict[str, Any]] = self.__load()
+        self.visited: Set[str] = set()
+        self.dirty = False
+
+    def __load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.file_path, mode="r", encoding="utf-8") as readable:
+                manifest = json.load(readable)
+            assert manifest["version"] == Manifest.VERSION
+            return manifest["entries"]
+        except:
+            return {}
+
+    # TaskHeader.read() with cache; exceptions are raised as it is
+    def __getitem__(self, config_path: str) -> TaskHeader:
+        rel_path = os.path.relpath(config_path, self.base_path)
+        stat = os.stat(config_path)
+        self.visited.add(rel_path)
+
+        entry = self.entries.get(rel_path)
+        if entry is not None \
+            and entry["mtime"] == stat.st_mtime_ns \
+            and entry["size"] == stat.st_size:
+            return TaskHeader(path=config_path, **entry["header"])
+
+        header = TaskHeader.read(config_path)
+        header_dict = dataclasses.asdict(header)
+        del header_dict["path"]
+
+        self.entries[rel_path] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "header": header_dict
+        }
+        self.dirty = True
+        return header
+
+    # drop entries of deleted configs and write atomically
+    # read-only tasks_path is tolerated as the cache is optional
+    @error_factory(False)
+    def save(self) -> bool:
+        removed = set(self.entries.keys()) - self.visited
+        for rel_path in removed:
+            del self.entries[rel_path]
+
+        if not self.dirty and len(removed) == 0:
+            return True
+
+        # tasks_path may be shared by nodes running shards
+        temp_path = self.file_path + f".{socket.gethostname()}.{os.getpid()}"
+        with open(temp_path, mode="w", encoding="utf-8") as writable:
+            json.dump({
+                "version": Manifest.VERSION,
+                "entries": self.entries
+            }, writable, ensure_ascii=False)
+        os.replace(temp_path, self.file_path)
+
+        self.dirty = False
+        return True
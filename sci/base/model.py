@@ -1,20 +1,28 @@
 import sys
 import json
+import math
+import time
 import string
 import base64
+import asyncio
+import hashlib
+import functools
 
 from dataclasses import dataclass, field
 from io import BytesIO
 
-from typing import Optional, List, Dict
-from typing import Literal, Any, ClassVar
+from typing import Optional, List, Tuple, Dict
+from typing import Literal, Any, ClassVar, Callable
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 from PIL import Image
 
 sys.dont_write_bytecode = True
 from . import utils
+from .cache import ResponseCache
+from .limit import RateLimiter, Backoff
 from .override import *
 
 ModelType = Literal["openai", "anthropic"]
@@ -24,19 +32,28 @@ RoleType = Literal["system", "user", "assistant"]
 @dataclass
 class Content:
     PLACEHOLDER: ClassVar[str] = "..."
+    # rough but pessimistic for most tokenizers, including CJK text
+    BYTES_PER_TOKEN: ClassVar[int] = 3
 
+    # image_ref: images are replaced by what it returns, e.g. blobs of Log
     def _asdict(
         self,
         style: ModelType = "openai",
         hide_text: bool = False,
         hide_image: bool = False,
+        image_ref: Optional[Callable[["ImageContent"], str]] = None,
         **_
     ) -> Dict[str, Any]:
         return getattr(self, f"_{style}")(
             hide_text=hide_text,
-            hide_image=hide_image
+            hide_image=hide_image,
+            image_ref=image_ref
         )
 
+    # tokens estimated before sending, see Agent.__fit()
+    def _tokens(self, style: ModelType = "openai", **_) -> int:
+        return getattr(self, f"_tokens_{style}")()
+
     def __dict_factory_override__(self) -> Dict[str, Any]:
         return self._asdict()
 
@@ -71,46 +88,156 @@ class TextContent(Content):
             "text": text
         }
 
+    def _tokens(self, hide_text: bool = False, use_format: bool = False, **_) -> int:
+        text = self._asdict(hide_text=hide_text, use_format=use_format)["text"]
+        return math.ceil(len(text.encode("utf-8")) / Content.BYTES_PER_TOKEN)
+
 
 @dataclass
 class ImageContent(Content):
     image: Image.Image
+    format: Literal["png", "jpeg", "webp"] = "png"
+    quality: Optional[int] = None
+    detail: str = "high"
+
+    # the image is encoded only once and shared by every payload rebuild
+    # and log dump; it should not be modified after the content is built
+    @functools.cached_property
+    def buffer(self) -> bytes:
+        image = self.image
+        if self.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        params = {} if self.quality is None else {"quality": self.quality}
+        image.save(buffered:=BytesIO(), format=self.format.upper(), **params)
+        return buffered.getvalue()
+
+    @functools.cached_property
+    def base64_data(self) -> str:
+        return base64.b64encode(self.buffer).decode()
 
     @property
-    def base64_png(self):
-        self.image.save(buffered:=BytesIO(), format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+    def media_type(self) -> str:
+        return f"image/{self.format}"
+
+    @functools.cached_property
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{self.base64_data}"
 
-    def _openai(self, hide_image: bool = False, **_) -> Dict[str, Any]:
+    @functools.cached_property
+    def digest(self) -> str:
+        return hashlib.sha256(self.buffer).hexdigest()
+
+    def _openai(
+        self,
+        hide_image: bool = False,
+        image_ref: Optional[Callable[["ImageContent"], str]] = None,
+        **_
+    ) -> Dict[str, Any]:
         return {
             "type": "image_url",
             "image_url": {
                 "url": (
-                    Content.PLACEHOLDER if hide_image \
-                        else f"data:image/png;base64,{self.base64_png}"
+                    Content.PLACEHOLDER if hide_image
+                    else self.data_url if image_ref is None
+                    else image_ref(self)
                 ),
-                "detail": "high"
+                "detail": self.detail
             }
         }
 
-    def _anthropic(self, hide_image: bool = False, **_) -> Dict[str, Any]:
+    def _anthropic(
+        self,
+        hide_image: bool = False,
+        image_ref: Optional[Callable[["ImageContent"], str]] = None,
+        **_
+    ) -> Dict[str, Any]:
         return {
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
-                "data": Content.PLACEHOLDER if hide_image else self.base64_png
+                "media_type": self.media_type,
+                "data": (
+                    Content.PLACEHOLDER if hide_image
+                    else self.base64_data if image_ref is None
+                    else image_ref(self)
+                )
             }
         }
 
-    def _gui_actor(self, hide_image: bool = False, **_) -> Dict[str, Any]:
+    def _gui_actor(
+        self,
+        hide_image: bool = False,
+        image_ref: Optional[Callable[["ImageContent"], str]] = None,
+        **_
+    ) -> Dict[str, Any]:
         return {
-            "image_base64": f"data:image/png;base64,{self.base64_png}"
+            "image_base64": self.data_url if image_ref is None else image_ref(self)
         }
 
+    # fit in 2048x2048, shortest side to 768, then 170 per 512x512 tile
+    def _tokens_openai(self) -> int:
+        if self.detail == "low":
+            return 85
+        width, height = self.image.size
+        ratio = min(1, 2048 / max(width, height))
+        width, height = width * ratio, height * ratio
+        ratio = min(1, 768 / min(width, height))
+        tiles = math.ceil(width * ratio / 512) * math.ceil(height * ratio / 512)
+        return 85 + 170 * tiles
+
+    # longer side is scaled down to 1568, then width * height / 750
+    def _tokens_anthropic(self) -> int:
+        width, height = self.image.size
+        ratio = min(1, 1568 / max(width, height))
+        return math.ceil(width * height * ratio * ratio / 750)
+
+    def _tokens_gui_actor(self) -> int:
+        return self._tokens_openai()
+
+
+# how screenshots are transcoded before being sent to models
+# - crop: (left, upper, right, lower) of the region to keep, e.g. app window
+# - max_side: longer side is scaled down to it with aspect ratio kept
+# - format / quality: lossy JPEG or WebP is much smaller than PNG
+# crop and max_side change coordinates in the image that models see
+# so they suit models answering in relative coordinates or SoM tags
+@dataclass
+class ImagePolicy:
+    max_side: Optional[int] = None
+    format: Literal["png", "jpeg", "webp"] = "png"
+    quality: Optional[int] = None
+    grayscale: bool = False
+    crop: Optional[Tuple[int, int, int, int]] = None
+    detail: str = "high"
+
+    def __post_init__(self) -> None:
+        assert self.max_side is None or self.max_side > 0
+        assert self.format in ("png", "jpeg", "webp")
+        assert self.quality is None or 0 < self.quality <= 100
+        assert self.crop is None or len(self.crop) == 4
+
+    def __call__(self, image: Image.Image) -> ImageContent:
+        if self.crop is not None:
+            image = image.crop(self.crop)
+
+        if self.grayscale:
+            image = image.convert("L")
+
+        if self.max_side is not None and max(image.size) > self.max_side:
+            ratio = self.max_side / max(image.size)
+            image = image.resize(
+                (round(image.width * ratio), round(image.height * ratio)),
+                Image.Resampling.LANCZOS
+            )
+
+        return ImageContent(image, self.format, self.quality, self.detail)
+
 
 @dataclass
 class Message:
+    OVERHEAD: ClassVar[int] = 4
+
     # message's style follows model_style
     style: ModelType
     role: RoleType
@@ -121,7 +248,8 @@ class Message:
         self,
         show_context: bool = False,
         hide_text: bool = False,
-        hide_image: bool = False
+        hide_image: bool = False,
+        image_ref: Optional[Callable[[ImageContent], str]] = None
     ) -> Dict[str, Any]:
         result = {
             "role": self.role,
@@ -130,6 +258,7 @@ class Message:
                     style=self.style,
                     hide_text=hide_text,
                     hide_image=hide_image,
+                    image_ref=image_ref,
                     use_format=self.role=="user"
                 )
                 for content in self.content
@@ -143,6 +272,16 @@ class Message:
     def __dict_factory_override__(self) -> Dict[str, Any]:
         return self._asdict()
 
+    def _tokens(self, hide_text: bool = False) -> int:
+        return Message.OVERHEAD + sum([
+            content._tokens(
+                style=self.style,
+                hide_text=hide_text,
+                use_format=self.role=="user"
+            )
+            for content in self.content
+        ])
+
 
 @dataclass
 class Model:
@@ -156,6 +295,44 @@ class Model:
     top_p: Optional[float] = 0.9
     temperature: Optional[float] = 0.5,
     reason_effort: Optional[str] = None
+    pool_size: int = 10
+    cache: Optional[ResponseCache] = None
+    stream: bool = False
+    rpm: Optional[float] = None
+    burst: Optional[int] = None
+    max_throttles: int = 5
+    max_context: Optional[int] = None
+    prompt_cache: bool = False
+
+    # keep-alive connections are reused across steps and forked agents
+    # proxies are still passed to every request, or requests would let
+    # HTTP(S)_PROXY in the environment override those of the session
+    def __post_init__(self) -> None:
+        assert isinstance(self.pool_size, int) and self.pool_size > 0
+        assert not self.stream or hasattr(self, f"_fold_{self.model_style}")
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # shared by every model with the same base_url
+        assert isinstance(self.max_throttles, int) and self.max_throttles >= 0
+        self.limiter = None if self.rpm is None \
+            else RateLimiter.get(self.base_url, self.rpm, self.burst)
+
+    # requests sent and connections opened by pools still alive
+    @property
+    def connections(self) -> Dict[str, int]:
+        stats = {"requests": 0, "connections": 0}
+        for adapter in set(self.session.adapters.values()):
+            for manager in [adapter.poolmanager, *adapter.proxy_manager.values()]:
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is not None:
+                        stats["requests"] += pool.num_requests
+                        stats["connections"] += pool.num_connections
+        stats["reused"] = stats["requests"] - stats["connections"]
+        return stats
 
     def message(
         self,
@@ -193,11 +370,16 @@ class Model:
         if self.temperature is None:   del payload["temperature"]
         if self.reason_effort is None: del payload["reasoning_effort"]
 
-        return requests.post(
+        if self.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+
+        return self.session.post(
             self.base_url,
-            headers=headers,
             proxies=self.proxies,
+            headers=headers,
             json=payload,
+            stream=self.stream,
             timeout=timeout
         )
 
@@ -218,14 +400,34 @@ class Model:
             "top_p": self.top_p
         }
 
-        return requests.post(
+        if self.stream:
+            payload["stream"] = True
+
+        if self.prompt_cache:
+            payload["messages"] = Model._mark_anthropic(messages)
+
+        return self.session.post(
             self.base_url,
-            headers=headers,
             proxies=self.proxies,
+            headers=headers,
             json=payload,
+            stream=self.stream,
             timeout=timeout
         )
 
+    # breakpoint of anthropic prompt caching at the end of the system message,
+    # the only prefix kept across steps once context_window starts to slide;
+    # a breakpoint in the history would pay for cache writes never read back
+    # messages are copied since the system message is shared by every step
+    @staticmethod
+    def _mark_anthropic(messages: List[Dict]) -> List[Dict]:
+        marked = list(messages)
+        if len(marked) > 0 and len(marked[0]["content"]) > 0:
+            content = list(marked[0]["content"])
+            content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+            marked[0] = {**marked[0], "content": content}
+        return marked
+
     def _request_gui_actor(self, messages: Dict, timeout: int) -> Response:
         content = messages[1]["content"]
         index = 0 if content[0]["type"] == "text" else 1
@@ -235,7 +437,7 @@ class Model:
             "model_name_or_path": self.model_name
         }
 
-        return requests.post(
+        return self.session.post(
             self.base_url,
             proxies=self.proxies,
             json=payload,
@@ -243,8 +445,161 @@ class Model:
             timeout=timeout
         )
 
-    def __call__(self, messages: Dict, timeout: int) -> Response:
-        return getattr(self, f"_request_{self.model_style}")(messages, timeout)
+    # deltas of text from one event of SSE; usage is updated in place
+    @staticmethod
+    def _fold_openai(event: Dict[str, Any], usage: Dict[str, int]) -> str:
+        if event.get("usage") is not None:
+            usage.update(event["usage"])
+        if len(choices := event.get("choices") or []) == 0:
+            return ""
+        return choices[0]["delta"].get("content") or ""
+
+    @staticmethod
+    def _fold_anthropic(event: Dict[str, Any], usage: Dict[str, int]) -> str:
+        assert event["type"] != "error", event["error"]
+        if event["type"] == "message_start":
+            usage.update(event["message"]["usage"])
+        elif event["type"] == "message_delta":
+            usage.update(event["usage"])
+        elif event["type"] == "content_block_delta":
+            return event["delta"].get("text", "")
+        return ""
+
+    # body of a complete response, so that access(), usage(),
+    # overflow handlers and cache do not care about streaming
+    # usage not sent before the stream ends or is cut is left None;
+    # output_tokens of message_start is partial, so it is dropped if cut
+    @staticmethod
+    def _assemble_openai(text: str, usage: Dict[str, int], cut: bool) -> Dict[str, Any]:
+        return {
+            "choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": {
+                "prompt_tokens": None,
+                **usage,
+                "completion_tokens": None if cut else usage.get("completion_tokens")
+            }
+        }
+
+    @staticmethod
+    def _assemble_anthropic(text: str, usage: Dict[str, int], cut: bool) -> Dict[str, Any]:
+        return {
+            "role": "assistant",
+            "content": [{"type": "text", "text": text}],
+            "usage": {
+                "input_tokens": None,
+                **usage,
+                "output_tokens": None if cut else usage.get("output_tokens")
+            }
+        }
+
+    # SSE is folded back into a plain response of the same style;
+    # until() sees every delta and returns the text to keep
+    # once the rest of the reply is no longer needed
+    def _collect(
+        self,
+        response: Response,
+        until: Optional[Callable[[str], Optional[str]]] = None
+    ) -> Response:
+        text, usage, cut = "", {}, False
+        collected = Response()
+        collected.encoding = "utf-8"
+        collected.headers["Content-Type"] = "application/json"
+
+        try:
+            response.encoding = "utf-8"
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line.startswith("data:"):
+                    continue
+                if (data := line[5:].strip()) == "[DONE]":
+                    break
+                delta = getattr(Model, f"_fold_{self.model_style}")(json.loads(data), usage)
+                text += delta
+                if until is not None and len(delta) > 0:
+                    if (kept := until(delta)) is not None:
+                        text, cut = kept, True
+                        break
+        except Exception as error:
+            collected.status_code = 502
+            collected._content = json.dumps({"error": repr(error)}).encode("utf-8")
+            return collected
+        finally:
+            response.close()
+
+        collected.status_code = response.status_code
+        collected._content = json.dumps(
+            getattr(Model, f"_assemble_{self.model_style}")(text, usage, cut)
+        ).encode("utf-8")
+        return collected
+
+    def __request(
+        self,
+        messages: Dict,
+        timeout: int,
+        until: Optional[Callable[[str], Optional[str]]]
+    ) -> Response:
+        # throttled requests are retried here, so that they do not
+        # use up retries of Agent which are meant for real failures
+        for attempt in range(self.max_throttles + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            response = getattr(self, f"_request_{self.model_style}")(messages, timeout)
+            if response.status_code not in Backoff.STATUS or attempt == self.max_throttles:
+                break
+
+            span = Backoff.delay(response, attempt)
+            response.close()
+            if self.limiter is not None:
+                self.limiter.hold(span)
+            else:
+                time.sleep(span)
+
+        content_type = response.headers.get("Content-Type", "")
+        if self.stream and content_type.startswith("text/event-stream"):
+            response = self._collect(response, until)
+        return response
+
+    # everything that decides the reply; base_url and api_key are left out
+    # so that mirrors of the same model share entries of cache
+    def _cache_key(self, messages: Dict, cut: bool = False) -> str:
+        return ResponseCache.key({
+            "model_style": self.model_style,
+            "model_name": self.model_name,
+            "version": self.version,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "temperature": self.temperature,
+            "reason_effort": self.reason_effort,
+            "cut": cut,
+            "messages": messages
+        })
+
+    def __call__(
+        self,
+        messages: Dict,
+        timeout: int,
+        until: Optional[Callable[[str], Optional[str]]] = None
+    ) -> Response:
+        if self.cache is None:
+            return self.__request(messages, timeout, until)
+
+        key = self._cache_key(messages, until is not None)
+        response = self.cache.get(key)
+        if response is None:
+            assert not self.cache.replay, f"Cache miss in replay mode: {key}"
+            response = self.__request(messages, timeout, until)
+            response.cache_key = key
+            response.from_cache = False
+        return response
+
+    # requests is kept as the HTTP client so that Response is the same
+    # for Overflow and access(); only the waiting is moved off event loop
+    async def acall(
+        self,
+        messages: Dict,
+        timeout: int,
+        until: Optional[Callable[[str], Optional[str]]] = None
+    ) -> Response:
+        return await asyncio.to_thread(self, messages, timeout, until)
 
     @staticmethod
     def _access_openai(response: Response) -> Message:
@@ -273,8 +628,40 @@ class Model:
             content=[TextContent(json.dumps(message["xy"]))]
         )
 
+    @staticmethod
+    def _usage_openai(response: Response) -> Tuple[Optional[int], ...]:
+        usage = response.json()["usage"]
+        details = usage.get("prompt_tokens_details") or {}
+        return (
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            details.get("cached_tokens") or 0
+        )
+
+    # input_tokens of anthropic leaves out tokens read from or written to cache
+    @staticmethod
+    def _usage_anthropic(response: Response) -> Tuple[Optional[int], ...]:
+        usage = response.json()["usage"]
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        cache_creation = usage.get("cache_creation_input_tokens") or 0
+        return (
+            None if usage.get("input_tokens") is None \
+                else usage["input_tokens"] + cache_read + cache_creation,
+            usage.get("output_tokens"),
+            cache_read
+        )
+
+    # (prompt_tokens, completion_tokens, cached_tokens) reported by the endpoint
+    # where cached_tokens is the part of prompt_tokens hit in cache
+    # and None is for those not reported, e.g. of a stream cut by until
+    @utils.error_factory((None, None, 0))
+    def usage(self, response: Response) -> Tuple[Optional[int], ...]:
+        return getattr(Model, f"_usage_{self.model_style}")(response)
+
     @utils.error_factory(None)
     def access(self, response: Response, context_window: int) -> Message:
         message = getattr(Model, f"_access_{self.model_style}")(response)
         message.context_window = context_window
+        if self.cache is not None and not getattr(response, "from_cache", True):
+            self.cache.put(response.cache_key, response)
         return message
@@ -0,0 +1,155 @@
+import sys
+import os
+import io
+import json
+import zipfile
+
+from typing import Optional, List, Dict, IO, Any
+
+sys.dont_write_bytecode = True
+
+# artefacts of a finished task rolled into one archive under its log dir
+# - zip with stored members: the central directory at the end is the index
+#   and any member can be read without touching the others
+# - *.log files stay outside, as Log rewrites them when the run ends
+#   and renames them to LAGACY@ when the task is retried
+# - files in the dir win over members of the same name, so that
+#   readers need not care whether a task has been packed or not
+class Pack:
+    FILENAME = "task.pack"
+    TRAJ_FILENAME = "traj.jsonl"
+    EXCLUDED_SUFFIXES = (".log", ".tmp")
+
+    # sub dirs holding artefacts, i.e. Log.BLOB_DIRNAME
+    # other dirs might be logs of other tasks and are left alone
+    DIRNAMES = ("blobs",)
+
+    def __init__(self, save_path: str) -> None:
+        assert isinstance(save_path, str)
+        self.save_path = save_path
+        self.file_path = os.path.join(save_path, Pack.FILENAME)
+        self.archive = zipfile.ZipFile(self.file_path, mode="r")
+        self.__steps: Optional[List[Dict[str, Any]]] = None
+
+    def __enter__(self) -> "Pack":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.archive.close()
+
+    def names(self) -> List[str]:
+        return self.archive.namelist()
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.archive.getinfo(name)
+            return True
+        except KeyError:
+            return False
+
+    def read(self, name: str) -> bytes:
+        return self.archive.read(name)
+
+    # records of traj.jsonl, e.g. step(0)["screenshot"] for read()
+    @property
+    def steps(self) -> List[Dict[str, Any]]:
+        if self.__steps is None:
+            self.__steps = [
+                json.loads(line)
+                for line in self.read(Pack.TRAJ_FILENAME).decode("utf-8").splitlines()
+                if len(line.strip()) > 0
+            ] if Pack.TRAJ_FILENAME in self else []
+        return self.__steps
+
+    def step(self, index: int) -> Dict[str, Any]:
+        return self.steps[index]
+
+    @staticmethod
+    def packed(save_path: str) -> bool:
+        return os.path.isfile(os.path.join(save_path, Pack.FILENAME))
+
+    # relative names in posix style, i.e. blobs/{digest}.png
+    @staticmethod
+    def listdir(save_path: str) -> List[str]:
+        names = set()
+        for filename in os.listdir(save_path):
+            file_path = os.path.join(save_path, filename)
+            if os.path.isfile(file_path):
+                names.add(filename)
+            elif filename in Pack.DIRNAMES and os.path.isdir(file_path):
+                names.update([
+                    f"{filename}/{member}"
+                    for member in os.listdir(file_path)
+                ])
+
+        if Pack.FILENAME in names:
+            names.remove(Pack.FILENAME)
+            with Pack(save_path) as pack:
+                names.update(pack.names())
+        return sorted(names)
+
+    @staticmethod
+    def exists(save_path: str, name: str) -> bool:
+        if os.path.exists(os.path.join(save_path, name)):
+            return True
+        if not Pack.packed(save_path):
+            return False
+        with Pack(save_path) as pack:
+            return name in pack
+
+    # binary file object of name, whether packed or not
+    @staticmethod
+    def open(save_path: str, name: str) -> IO[bytes]:
+        file_path = os.path.join(save_path, name)
+        if os.path.exists(file_path) or not Pack.packed(save_path):
+            return open(file_path, mode="rb")
+        with Pack(save_path) as pack:
+            try:
+                return io.BytesIO(pack.read(name))
+            except KeyError:
+                raise FileNotFoundError(file_path)
+
+    # pack all files under save_path except *.log and remove them then
+    # the archive is written aside and renamed, so it is never partial
+    @staticmethod
+    def pack(save_path: str) -> Optional[str]:
+        assert os.path.isdir(save_path)
+        file_path = os.path.join(save_path, Pack.FILENAME)
+        names = [
+            name for name in Pack.listdir(save_path)
+            if not name.endswith(Pack.EXCLUDED_SUFFIXES)
+        ]
+        if len(names) == 0:
+            return None
+
+        temp_file_path = file_path + ".tmp"
+        previous = Pack(save_path) if Pack.packed(save_path) else None
+        try:
+            with zipfile.ZipFile(
+                temp_file_path,
+                mode="w",
+                compression=zipfile.ZIP_STORED
+            ) as archive:
+                for name in names:
+                    member_path = os.path.join(save_path, name)
+                    if os.path.exists(member_path):
+                        archive.write(member_path, arcname=name)
+                    else:
+                        archive.writestr(name, previous.read(name))
+        finally:
+            if previous is not None:
+                previous.close()
+        os.replace(temp_file_path, file_path)
+
+        for name in names:
+            member_path = os.path.join(save_path, name)
+            if os.path.exists(member_path):
+                os.remove(member_path)
+        for dirname in Pack.DIRNAMES:
+            dir_path = os.path.join(save_path, dirname)
+            if os.path.isdir(dir_path) and len(os.listdir(dir_path)) == 0:
+                os.rmdir(dir_path)
+        return file_path
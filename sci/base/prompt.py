@@ -12,7 +12,7 @@ import traceback
 
 from dataclasses import dataclass
 
-from typing import List, Set, FrozenSet, Optional
+from typing import List, Set, FrozenSet, Optional, Tuple, Dict
 from typing import Callable, Self, NoReturn
 
 sys.dont_write_bytecode = True
@@ -144,6 +144,37 @@ class CodeLike:
         ]
         return [CodeLike(code=code) for code in occurence]
 
+    # incremental counterpart of extract_antiquot() for streamed replies
+    # deltas are fed in turn; once the first fenced block is closed
+    # the text up to its closing fence is returned and the rest is not needed
+    class Fence:
+        MARK = "```"
+        STYLES = {"antiquot"}
+
+        def __init__(self) -> None:
+            self.text = ""
+            self.opening: Optional[int] = None
+            self.closing: Optional[int] = None
+
+        def __call__(self, delta: str) -> Optional[str]:
+            if self.closing is not None:
+                return self.text
+
+            # marks can be split across deltas
+            start = max(len(self.text) - len(self.MARK) + 1, 0)
+            self.text += delta
+            if self.opening is None:
+                if (index := self.text.find(self.MARK, start)) < 0:
+                    return None
+                self.opening = index
+
+            start = max(start, self.opening + len(self.MARK))
+            if (index := self.text.find(self.MARK, start)) < 0:
+                return None
+            self.closing = index + len(self.MARK)
+            self.text = self.text[:self.closing]
+            return self.text
+
     @_tag_handler
     @staticmethod
     def extract_antiquot(content: TextContent) -> List[Self]:
@@ -277,6 +308,9 @@ class CodeLike:
 
 
 class PromptFactory:
+    # system prompts without instruction, shared by all tasks and agents
+    TEMPLATES: Dict[Tuple, str] = {}
+
     def __init__(self, code_style: str) -> None:
         assert hasattr(CodeLike, func_name:=f"wrap_{code_style}")
         self.code_style = code_style
@@ -442,6 +476,9 @@ class AIOPromptFactory(PromptFactory):
             self.SYSTEM_INSTRUCTION.__func__(inst)
         ])
 
+    # sections other than _ending() depend on nothing but the key
+    # so they are only built once; docs of virtual primitives come from
+    # methods of the manager, which are the same for its whole class
     def __call__(
         self,
         obs: FrozenSet[str],
@@ -449,10 +486,27 @@ class AIOPromptFactory(PromptFactory):
         primitives: Set[str],
         manager: Optional[Manager]
     ) -> Callable[[str], str]:
+        # TypeSort compares by repr, which is the same for all VM apps
+        key = (
+            self.__class__,
+            self.code_style,
+            frozenset(obs),
+            type_sort.type,
+            type_sort.sort,
+            frozenset(primitives),
+            manager.__class__
+        )
+
+        if (template := PromptFactory.TEMPLATES.get(key)) is None:
+            template = "\n\n".join(PromptFactory.filter([
+                self._intro(obs, type_sort),
+                self._command(obs, type_sort, primitives, manager),
+                self._warning(type_sort)
+            ]))
+            PromptFactory.TEMPLATES[key] = template
+
         return lambda inst: "\n\n".join(PromptFactory.filter([
-            self._intro(obs, type_sort),
-            self._command(obs, type_sort, primitives, manager),
-            self._warning(type_sort),
+            template,
             self._ending()(inst)
         ]))
 
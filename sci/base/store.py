@@ -0,0 +1,222 @@
+import sys
+import os
+import time
+import sqlite3
+import pathlib
+import threading
+
+from contextlib import closing
+from typing import Optional, Iterable, List, Tuple, Set, Dict, Any
+
+sys.dont_write_bytecode = True
+from .log import Log
+from .pack import Pack
+
+# single-file index of results keyed by (logs_path, ident)
+# result.out is still written by Log as the source of truth
+# and it is imported by backfill() for logs without records
+class ResultStore:
+    FILENAME = "results.db"
+    TIMEOUT = 60
+
+    PASSED = "passed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            logs_path TEXT NOT NULL,
+            ident TEXT NOT NULL,
+            result TEXT NOT NULL,
+            stop_type TEXT,
+            steps INTEGER,
+            started REAL,
+            finished REAL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            PRIMARY KEY (logs_path, ident)
+        )
+    """
+
+    def __init__(self, db_path: str) -> None:
+        assert isinstance(db_path, str)
+        self.db_path = os.path.expanduser(db_path)
+        os.makedirs(os.path.split(os.path.abspath(self.db_path))[0], exist_ok=True)
+
+        # shared by parallel workers of the same Tester
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.db_path,
+            timeout=ResultStore.TIMEOUT,
+            check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.execute(ResultStore.SCHEMA)
+
+    @staticmethod
+    def key(logs_path: str) -> str:
+        return os.path.abspath(os.path.expanduser(logs_path))
+
+    def __execute(self, sql: str, params: Iterable = ()) -> List[Tuple]:
+        with self.lock, self.connection:
+            return self.connection.execute(sql, tuple(params)).fetchall()
+
+    def record(
+        self,
+        logs_path: str,
+        ident: str,
+        result: str,
+        started: Optional[float] = None,
+        summary: Dict[str, Any] = {}
+    ) -> None:
+        assert result in (self.PASSED, self.FAILED, self.SKIPPED)
+        self.__execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.key(logs_path),
+                ident,
+                result,
+                summary.get("stop_type"),
+                summary.get("steps"),
+                started,
+                time.time(),
+                summary.get("prompt_tokens"),
+                summary.get("completion_tokens")
+            )
+        )
+
+    # idents having result.out, i.e. passed or failed
+    def finished(self, logs_path: str) -> Set[str]:
+        return {ident for ident, in self.__execute(
+            "SELECT ident FROM results WHERE logs_path = ? AND result IN (?, ?)",
+            (self.key(logs_path), self.PASSED, self.FAILED)
+        )}
+
+    # idents whose log dirs exist, listing each parent dir only once
+    @staticmethod
+    def __present(logs_path: str, idents: Iterable[str]) -> Set[str]:
+        parents: Dict[str, List[str]] = {}
+        for ident in idents:
+            parent, _, name = ident.rpartition("/")
+            parents.setdefault(parent, []).append(name)
+
+        present = set()
+        for parent, names in parents.items():
+            try:
+                with os.scandir(os.path.join(logs_path, parent)) as entries:
+                    dirnames = {entry.name for entry in entries if entry.is_dir()}
+            except FileNotFoundError:
+                continue
+            present.update([
+                f"{parent}/{name}" if parent != "" else name
+                for name in names if name in dirnames
+            ])
+        return present
+
+    # keep records of idents in line with result.out, which is the source of truth
+    # - result.out of idents never recorded is imported
+    # - finished records are dropped once their log dirs are gone, e.g.
+    #   deleted by hand so as to re-run the tasks
+    # log dirs are listed once and only unknown ones are probed,
+    # so packed tasks are not reopened on each run
+    def backfill(self, logs_path: str, idents: Iterable[str]) -> None:
+        known = dict(self.__execute(
+            "SELECT ident, result FROM results WHERE logs_path = ?",
+            (self.key(logs_path),)
+        ))
+
+        idents = list(idents)
+        present = self.__present(logs_path, idents)
+        stale = [
+            ident for ident in idents
+            if ident in known and known[ident] != self.SKIPPED
+            and ident not in present
+        ]
+
+        for ident in idents:
+            save_path = os.path.join(logs_path, ident)
+            if ident in known or ident not in present \
+                or not Pack.exists(save_path, Log.RESULT_FILENAME):
+                continue
+
+            with Pack.open(save_path, Log.RESULT_FILENAME) as readable:
+                passed = readable.read().decode("utf-8").strip() == "1"
+            self.__execute(
+                "INSERT OR IGNORE INTO results (logs_path, ident, result) VALUES (?, ?, ?)",
+                (self.key(logs_path), ident, self.PASSED if passed else self.FAILED)
+            )
+
+        if len(stale) > 0:
+            self.forget(logs_path, stale)
+
+    # take rows of other store files, e.g. those of other hosts under steal
+    # - they are opened read-only and immutable, so no lock is taken on
+    #   shared volumes like NFS, where locks of SQLite are unreliable
+    # - a row replaces the known one only if it is finished later
+    def merge(self, db_paths: Iterable[str]) -> None:
+        for db_path in db_paths:
+            db_path = os.path.abspath(os.path.expanduser(db_path))
+            if db_path == os.path.abspath(self.db_path):
+                continue
+            try:
+                uri = pathlib.Path(db_path).as_uri() + "?mode=ro&immutable=1"
+                with closing(sqlite3.connect(uri, uri=True)) as connection:
+                    rows = connection.execute(
+                        "SELECT logs_path, ident, result, stop_type, steps, started, "
+                        "finished, prompt_tokens, completion_tokens FROM results"
+                    ).fetchall()
+            except sqlite3.Error:
+                continue
+
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (logs_path, ident) DO UPDATE SET "
+                    "result = excluded.result, stop_type = excluded.stop_type, "
+                    "steps = excluded.steps, started = excluded.started, "
+                    "finished = excluded.finished, "
+                    "prompt_tokens = excluded.prompt_tokens, "
+                    "completion_tokens = excluded.completion_tokens "
+                    "WHERE COALESCE(excluded.finished, 0) > COALESCE(results.finished, 0)",
+                    rows
+                )
+
+    # to re-run tasks regardless of their result.out
+    def forget(self, logs_path: str, idents: Optional[Iterable[str]] = None) -> None:
+        if idents is None:
+            self.__execute(
+                "DELETE FROM results WHERE logs_path = ?",
+                (self.key(logs_path),)
+            )
+        else:
+            for ident in idents:
+                self.__execute(
+                    "DELETE FROM results WHERE logs_path = ? AND ident = ?",
+                    (self.key(logs_path), ident)
+                )
+
+    # (ident, steps, seconds) of finished runs across all logs_path
+    # runs imported by backfill() have no timing and are left out
+    def durations(self) -> List[Tuple[str, int, float]]:
+        return self.__execute(
+            "SELECT ident, steps, finished - started FROM results "
+            "WHERE result IN (?, ?) AND started IS NOT NULL AND steps > 0",
+            (self.PASSED, self.FAILED)
+        )
+
+    def summary(self, logs_path: str) -> Dict[str, int]:
+        counts = {self.PASSED: 0, self.FAILED: 0, self.SKIPPED: 0}
+        counts.update(self.__execute(
+            "SELECT result, COUNT(*) FROM results WHERE logs_path = ? GROUP BY result",
+            (self.key(logs_path),)
+        ))
+        return counts
+
+    # (ident, left result, right result) of tasks recorded in both runs
+    def compare(self, left: str, right: str) -> List[Tuple[str, str, str]]:
+        return self.__execute(
+            "SELECT l.ident, l.result, r.result FROM results l "
+            "JOIN results r ON l.ident = r.ident "
+            "WHERE l.logs_path = ? AND r.logs_path = ? ORDER BY l.ident",
+            (self.key(left), self.key(right))
+        )
@@ -2,19 +2,72 @@ import sys
 import os
 import re
 import json
+import asyncio
+import hashlib
 import traceback
 
-from typing import List, Tuple, Set, Union, Optional
+from dataclasses import dataclass
+from typing import List, Tuple, Set, Dict, Union, Optional
 from typing import Any, Iterable, Callable, NoReturn
 
 sys.dont_write_bytecode = True
-from .agent import Primitive
+from .agent import Primitive, CodeLike
 from .community import Community
 from .manager import OBS, Manager
 from .log import Log, VirtualLog
-from .utils import TypeSort, relative_py
+from .utils import TypeSort, Timer, relative_py
 from . import init
 
+# header of config.json, which is enough to sort and group tasks
+# so that Task (and its manager) is not built until it is about to run
+@dataclass
+class TaskHeader:
+    path: str
+    name: str
+    type: str
+    sort: str
+    steps: int
+    version: str
+    init_hash: str = ""
+    eval_hash: str = ""
+
+    @property
+    def type_sort(self) -> TypeSort:
+        return TypeSort(self.type, TypeSort.Sort._member_map_[self.sort])
+
+    # to tell whether results of two runs are comparable
+    @staticmethod
+    def digest(obj: Any) -> str:
+        return hashlib.sha1(json.dumps(
+            obj,
+            ensure_ascii=False,
+            sort_keys=True
+        ).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def read(config_path: str) -> "TaskHeader":
+        assert isinstance(config_path, str)
+        config_path = os.path.expanduser(config_path)
+        with open(config_path, mode="r", encoding="utf-8") as readable:
+            config = json.load(readable)
+
+        assert isinstance(config.get("type"), str)
+        assert config.get("sort") in TypeSort.Sort._member_names_
+        assert isinstance(config.get("steps"), int)
+        assert isinstance(config.get("version"), str)
+
+        return TaskHeader(
+            path=config_path,
+            name=os.path.split(config_path)[1].split(".")[0],
+            type=config["type"],
+            sort=config["sort"],
+            steps=config["steps"],
+            version=config["version"],
+            init_hash=TaskHeader.digest(config.get("initialize")),
+            eval_hash=TaskHeader.digest(config.get("evaluate"))
+        )
+
+
 # base class for all tasks
 # - subclass should include:
 #   - __init__(): just check type and call super.__init__()
@@ -98,6 +151,39 @@ class Task:
 
         self.vlog = VirtualLog()
 
+        # filled during __call__() for the summary
+        self.stop_type: Optional[str] = None
+        self.step_count = 0
+        self.timer = Timer()
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        prompt_tokens, completion_tokens, cached_tokens, overflows = 0, 0, 0, 0
+        unreported, replayed = 0, 0
+        for _, agent in self.community:
+            prompt_tokens += agent.usage[0]
+            completion_tokens += agent.usage[1]
+            cached_tokens += agent.usage[2]
+            overflows += agent.overflows
+            unreported += agent.unreported
+            replayed += agent.replayed
+
+        return {
+            "type": self.type,
+            "sort": self.sort,
+            "obs": sorted(self.obs_types),
+            "stop_type": self.stop_type,
+            "steps": self.step_count,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "unreported_usage": unreported,
+            "replayed": replayed,
+            "overflows": overflows,
+            "seconds": self.timer.wall,
+            "timing": self.timer.summary()
+        }
+
     @property
     def available(self) -> bool:
         manager = getattr(self, "manager", None)
@@ -223,7 +309,8 @@ class Task:
                 kwargs["manager"] = self.manager
 
             result = handler(**kwargs)
-            Manager.pause(wait)
+            with self.timer("pause"):
+                Manager.pause(wait)
             return result
 
         # try `Task.CONFIG_RETRY` times
@@ -239,7 +326,8 @@ class Task:
             # if error occurred / do not return True
             # then stop init and retry in next iteration
             for init_item in self.initialize:
-                Manager.pause()
+                with self.timer("pause"):
+                    Manager.pause()
                 succeed = False
                 try:
                     succeed = func(**init_item)
@@ -261,51 +349,117 @@ class Task:
                 continue
         return False
 
-    def _step(self, step_index: int) -> bool:
-        observation = {
-            obs_type: getattr(self.manager, obs_type)()
-            for obs_type in self.obs_types
-        }
-
-        # special cases: SoM -> SoM + A11y Tree
+    # special cases: SoM -> SoM + A11y Tree
+    def __nest(self, observation: Dict[str, Any]) -> Optional[List[List[int]]]:
         nested_tags = None
         if OBS.set_of_marks in observation:
             nested_tags, som, a11y_tree = observation[OBS.set_of_marks]
             observation[OBS.a11y_tree] = a11y_tree
             observation[OBS.set_of_marks] = som
+        return nested_tags
+
+    def __community_args(
+        self,
+        step_index: int,
+        observation: Dict[str, Any],
+        nested_tags: Optional[List[List[int]]]
+    ) -> Dict[str, Any]:
+        return {
+            "steps": (step_index, self.steps),
+            "inst": self.instruction,
+            "obs": observation,
+            "code_info": (self.primitives, nested_tags),
+            "type_sort": self.type_sort,
+            "timeout": self.manager.HETERO_TIMEOUT,
+            "manager": self.manager
+        }
+
+    # save the log first
+    # becase primitives would cause exceptions
+    def __save(
+        self,
+        step_index: int,
+        observation: Dict[str, Any],
+        response_codes: List[CodeLike]
+    ) -> Dict[str, Any]:
+        with self.timer("save"):
+            return self.vlog.save(
+                step_index=step_index,
+                obs=observation,
+                codes=response_codes,
+                community=self.community,
+                is_textual=OBS.textual in observation
+            )
+
+    # trajectory is appended after codes have been executed
+    # so that timing of the whole step is included
+    def __trace(self, traj_obj: Dict[str, Any]) -> None:
+        for name, agent in self.community:
+            for seconds in agent.timing:
+                self.timer.add(f"model.{name}", seconds)
+            agent.timing.clear()
+        traj_obj["timing"] = self.timer.lap()
+        self.vlog.trace(traj_obj)
+
+    def _step(self, step_index: int) -> bool:
+        observation = {}
+        for obs_type in self.obs_types:
+            with self.timer(f"obs.{obs_type}"):
+                observation[obs_type] = getattr(self.manager, obs_type)()
+        nested_tags = self.__nest(observation)
 
         # preserved action for multi-agents corporation
         response_codes = self.community(
-            steps=(step_index, self.steps),
-            inst=self.instruction,
-            obs=observation,
-            code_info=(self.primitives, nested_tags),
-            type_sort=self.type_sort,
-            timeout=self.manager.HETERO_TIMEOUT,
-            manager=self.manager
-        )
-
-        # save the log first
-        # becase primitives would cause exceptions
-        self.vlog.save(
-            step_index=step_index,
-            obs=observation,
-            codes=response_codes,
-            community=self.community,
-            is_textual=OBS.textual in observation
+            **self.__community_args(step_index, observation, nested_tags)
         )
+        traj_obj = self.__save(step_index, observation, response_codes)
 
         results = []
-        for code_like in response_codes:
-            if self.relative:
-                code_like.push_prefix(relative_py, back=False)
-            results.append(code_like(self.manager, self.primitives))
-            Manager.pause()
+        try:
+            for code_like in response_codes:
+                if self.relative:
+                    code_like.push_prefix(relative_py, back=False)
+                with self.timer("code"):
+                    results.append(code_like(self.manager, self.primitives))
+                with self.timer("pause"):
+                    Manager.pause()
+        finally:
+            self.__trace(traj_obj)
 
         # Manager.__call__() return True/None if success/undecidable
         # if all code blocks fail, one liquidation is counted
         return all([item is False for item in results])
 
+    # the same as _step() except that waiting does not block event loop
+    async def _astep(self, step_index: int) -> bool:
+        observation = {}
+        for obs_type in self.obs_types:
+            with self.timer(f"obs.{obs_type}"):
+                observation[obs_type] = await getattr(self.manager, f"a{obs_type}")()
+        nested_tags = self.__nest(observation)
+
+        response_codes = await self.community.acall(
+            **self.__community_args(step_index, observation, nested_tags)
+        )
+        traj_obj = self.__save(step_index, observation, response_codes)
+
+        results = []
+        try:
+            for code_like in response_codes:
+                if self.relative:
+                    code_like.push_prefix(relative_py, back=False)
+                with self.timer("code"):
+                    results.append(await asyncio.to_thread(
+                        code_like,
+                        self.manager,
+                        self.primitives
+                    ))
+                with self.timer("pause"):
+                    await Manager.apause()
+        finally:
+            self.__trace(traj_obj)
+        return all([item is False for item in results])
+
     # warning: this method will reset inner status of agents
     def __test_prompt(self) -> None:
         obs = frozenset({OBS.screenshot if self.manager.is_gui else OBS.textual})
@@ -320,22 +474,40 @@ class Task:
             prompt = agent.system_message.content[0].text
             self.vlog.info(f"Prompt sample of {name}: \n" + prompt)
 
+    def __penalize(self, liquid: int) -> int:
+        if liquid >= self.penalty[0]:
+            liquid = 0
+            self.steps -= self.penalty[1]
+            self.vlog.warning(
+                f"Total steps are reduced to {self.steps} "
+                f"due to {self.penalty[0]} consecutive incorrect inputs."
+            )
+        return liquid
+
     @_avail_handler
     @Log.record_handler
     def predict(self) -> Tuple[staticmethod, List[str]]:
         try:
             liquid, step_index = 0, 0
             while step_index < self.steps:
+                self.step_count = step_index + 1
                 invalid = self._step(step_index)
                 step_index += 1
-                liquid += 1 if invalid else 0
-                if liquid >= self.penalty[0]:
-                    liquid = 0
-                    self.steps -= self.penalty[1]
-                    self.vlog.warning(
-                        f"Total steps are reduced to {self.steps} "
-                        f"due to {self.penalty[0]} consecutive incorrect inputs."
-                    )
+                liquid = self.__penalize(liquid + (1 if invalid else 0))
+        except Primitive.PlannedTermination as early_stop:
+            return early_stop.type, list(early_stop.args)
+        return Primitive.TIMEOUT, []
+
+    @_avail_handler
+    @Log.record_handler
+    async def apredict(self) -> Tuple[staticmethod, List[str]]:
+        try:
+            liquid, step_index = 0, 0
+            while step_index < self.steps:
+                self.step_count = step_index + 1
+                invalid = await self._astep(step_index)
+                step_index += 1
+                liquid = self.__penalize(liquid + (1 if invalid else 0))
         except Primitive.PlannedTermination as early_stop:
             return early_stop.type, list(early_stop.args)
         return Primitive.TIMEOUT, []
@@ -371,9 +543,35 @@ class Task:
         else:
             return True
 
+    def __reset(self) -> None:
+        self.stop_type = None
+        self.step_count = 0
+        self.timer = Timer()
+        for _, agent in self.community:
+            agent.usage = [0, 0, 0]
+            agent.unreported = 0
+            agent.replayed = 0
+            agent.timing = []
+            agent.shrink, agent.quiet, agent.overflows = 0, 0, 0
+
+    # pauses inside init() are only kept in the summary
+    def __init(self) -> bool:
+        with self.timer("init"):
+            succeed = self.init()
+        self.timer.lap()
+        return succeed
+
     def __call(self) -> bool:
+        self.__reset()
+        try:
+            return self.__run()
+        finally:
+            self.timer.stop()
+            self.vlog.summarize(self.summary)
+
+    def __run(self) -> bool:
         self.vlog.info("Starting initialization.")
-        assert self.init(), "Fail to initialize the task"
+        assert self.__init(), "Fail to initialize the task"
         if self.debug:
             # input value will be converted to stop_type
             # default to TIMEOUT
@@ -392,8 +590,10 @@ class Task:
         else:
             self.vlog.info("Starting prediction.")
             stop_type, stop_args = self.predict()
+        self.stop_type = stop_type.__name__
         self.vlog.info(f"Starting evaluation with stop type of {stop_type.__name__}.")
-        return self.eval(stop_type, stop_args)
+        with self.timer("eval"):
+            return self.eval(stop_type, stop_args)
 
     @_avail_handler
     def __call__(self) -> bool:
@@ -404,3 +604,36 @@ class Task:
         else:
             self.manager._post__enter__()
             return self.__call()
+
+    # init() and eval() are short and rarely wait for models
+    # so they are simply moved to threads
+    async def __acall(self) -> bool:
+        if self.debug:
+            return await asyncio.to_thread(self.__call)
+
+        self.__reset()
+        try:
+            return await self.__arun()
+        finally:
+            self.timer.stop()
+            self.vlog.summarize(self.summary)
+
+    async def __arun(self) -> bool:
+        self.vlog.info("Starting initialization.")
+        assert await asyncio.to_thread(self.__init), "Fail to initialize the task"
+        self.vlog.info("Starting prediction.")
+        stop_type, stop_args = await self.apredict()
+        self.stop_type = stop_type.__name__
+        self.vlog.info(f"Starting evaluation with stop type of {stop_type.__name__}.")
+        with self.timer("eval"):
+            return await asyncio.to_thread(self.eval, stop_type, stop_args)
+
+    @_avail_handler
+    async def acall(self) -> bool:
+        self.vlog.info(f"\033[1mTask: {self.instruction}\033[0m")
+        if not self.manager.entered:
+            with self.manager:
+                return await self.__acall()
+        else:
+            self.manager._post__enter__()
+            return await self.__acall()
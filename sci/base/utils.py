@@ -1,11 +1,12 @@
 import sys
 import os
+import time
 import inspect
 import multiprocessing
 import traceback
 
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, List, Dict, Any, Generator
 from typing import Callable, ClassVar, Self
 from dataclasses import dataclass
 from contextlib import contextmanager
@@ -86,6 +87,50 @@ def want(cls):
         return self
 
 
+# monotonic durations of named phases of a task
+# lap() takes phases of the current step (one duration per occurrence)
+# while total keeps the sum of each phase over the whole task
+# phases may nest, e.g. pause in init, so wall time is kept aside
+class Timer:
+    PRECISION = 4
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, List[float]] = {}
+        self.total: Dict[str, float] = {}
+        self.started = time.monotonic()
+        self.stopped: Optional[float] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases.setdefault(phase, []).append(round(seconds, self.PRECISION))
+        self.total[phase] = self.total.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def __call__(self, phase: str) -> Generator:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, time.monotonic() - start)
+
+    def lap(self) -> Dict[str, List[float]]:
+        phases, self.phases = self.phases, {}
+        return phases
+
+    def stop(self) -> None:
+        self.stopped = time.monotonic()
+
+    @property
+    def wall(self) -> float:
+        stopped = time.monotonic() if self.stopped is None else self.stopped
+        return round(stopped - self.started, self.PRECISION)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            phase: round(seconds, self.PRECISION)
+            for phase, seconds in self.total.items()
+        }
+
+
 @contextmanager
 def temp_chdir(path):
     last_path = os.getcwd()
@@ -2,6 +2,8 @@ import sys
 import os
 import re
 import json
+import shutil
+import filecmp
 import zipfile
 import subprocess
 
@@ -39,6 +41,7 @@ class VirtualEnv(TypedDict):
 class VManager(Manager):
     ISO_PATH = "/tmp/ubuntu.iso"
     VM_PATH = "vmware"
+    CLONE_PATH = "vmware_{index}"
     VMX_NAME = "Ubuntu.vmx"
     VERSION_NAME = "__VERSION__"
 
@@ -157,7 +160,8 @@ class VManager(Manager):
         self,
         command: str,
         *args: str,
-        tolerance: Iterable[int] = []
+        tolerance: Iterable[int] = [],
+        path: Optional[str] = None
     ) -> Tuple[str, bool]:
         assert isinstance(command, str)
         for arg in args:
@@ -178,7 +182,7 @@ class VManager(Manager):
             "-gp",
             Prompts.VM_PASSWORD,
             command,
-            self.path,
+            self.path if path is None else path,
             *args
         ], text=True, capture_output=True, encoding="utf-8")
 
@@ -198,6 +202,40 @@ class VManager(Manager):
         _, success = self._vmrun("snapshot", snapshot_name)
         return success
 
+    # linked clone for parallel workers, which shares disks with self.path
+    # snapshot is not inherited by clones, so it is re-created at once
+    # clones left by a base VM of another version are cloned again
+    def _clone(self, index: int) -> Optional[str]:
+        assert isinstance(index, int)
+        clone_dir = os.path.join(
+            os.path.abspath("."),
+            VManager.CLONE_PATH.format(index=index)
+        )
+        clone_path = os.path.join(clone_dir, VManager.VMX_NAME)
+        version_path = os.path.join(os.path.split(self.path)[0], VManager.VERSION_NAME)
+        clone_version_path = os.path.join(clone_dir, VManager.VERSION_NAME)
+        if os.path.exists(clone_path):
+            if os.path.exists(clone_version_path) \
+                and filecmp.cmp(version_path, clone_version_path, shallow=False):
+                return clone_path
+            GLOBAL_VLOG.info(f"Clone of worker #{index} is outdated; cloning again.")
+            self._vmrun("deleteVM", path=clone_path)
+            shutil.rmtree(clone_dir, ignore_errors=True)
+
+        _, success = self._vmrun(
+            "clone",
+            clone_path,
+            "linked",
+            f"-snapshot={VManager.INIT_NAME}",
+            f"-cloneName={os.path.split(clone_dir)[1]}"
+        )
+        if not success:
+            return None
+
+        shutil.copyfile(version_path, clone_version_path)
+        _, success = self._vmrun("snapshot", VManager.INIT_NAME, path=clone_path)
+        return clone_path if success else None
+
     # very hard to use, try task._execute() instead
     def _run(self, text: str, tolerance: Iterable[int] = []) -> bool:
         assert isinstance(text, str)